@@ -1,17 +1,28 @@
 import streamlit as st
+import functools
+import html
+import math
 import os
-import tempfile
-import warnings
-import requests
-import json
-import PyPDF2
-import docx
-import csv
-import io
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
-import numpy as np
 import time
+import warnings
+
+from pipeline import (
+    DONE,
+    EXPORT_FORMATS,
+    FAILED,
+    deck_hash,
+    estimate_wait,
+    export_bundle,
+    export_bytes,
+    extract_file,
+    get_job,
+    get_logger,
+    missing_api_keys,
+    parquet_available,
+    span,
+    start_metrics_server,
+    submit_job,
+)
 
 # Filter out the legacy warning
 warnings.filterwarnings("ignore", message=".*legacy.*")
@@ -19,684 +30,140 @@ warnings.filterwarnings("ignore", message=".*legacy.*")
 # Set page config
 st.set_page_config(page_title="FlashForge-AI", layout="wide")
 
-# Custom CSS for enhanced styling
-st.markdown("""
-    <style>
-        /* Main theme colors */
-        :root {
-            --primary-color: #6B46C1;
-            --secondary-color: #805AD5;
-            --accent-color: #9F7AEA;
-            --background-color: #F7FAFC;
-            --text-color: #2D3748;
-            --card-bg: #FFFFFF;
-            --card-text: #2D3748;
-            --gradient-start: #6B46C1;
-            --gradient-end: #9F7AEA;
-        }
-
-        /* Global styles */
-        .stApp {
-            background-color: var(--background-color);
-        }
-
-        /* Main container background */
-        .main .block-container {
-            background-color: var(--background-color);
-            padding: 2rem;
-        }
-
-        /* Sidebar background */
-        .css-1d391kg, .css-1siy2j7 {
-            background-color: var(--background-color) !important;
-        }
-
-        /* Title styling */
-        h1 {
-            color: var(--primary-color);
-            font-size: 3rem !important;
-            font-weight: 700 !important;
-            text-align: center;
-            padding: 1rem;
-            margin-bottom: 2rem;
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-        }
-
-        /* Subheader styling */
-        h3 {
-            color: var(--primary-color);
-            font-weight: 600 !important;
-        }
-
-        /* Sidebar styling */
-        .css-1d391kg {
-            background-color: var(--card-bg);
-            padding: 1rem;
-            border-radius: 10px;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-        }
-
-        /* Button styling */
-        .stButton > button {
-            background: linear-gradient(135deg, var(--gradient-start), var(--gradient-end));
-            color: white !important;
-            border: none;
-            padding: 0.5rem 1rem;
-            border-radius: 5px;
-            transition: all 0.3s ease;
-        }
-
-        .stButton > button:hover {
-            background: linear-gradient(135deg, var(--gradient-end), var(--gradient-start));
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-        }
-
-        /* Card styling */
-        .card-container {
-            display: grid;
-            grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
-            gap: 20px;
-            padding: 20px;
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-
-        .card {
-            perspective: 1000px;
-            min-height: 200px;
-            margin: 10px;
-        }
-
-        .card-inner {
-            position: relative;
-            width: 100%;
-            height: 100%;
-            min-height: 200px;
-            text-align: center;
-            transition: transform 0.6s;
-            transform-style: preserve-3d;
-            cursor: pointer;
-        }
-
-        .card:hover .card-inner {
-            transform: rotateY(180deg);
-        }
-
-        .card-front, .card-back {
-            position: absolute;
-            width: 100%;
-            height: 100%;
-            backface-visibility: hidden;
-            border-radius: 15px;
-            padding: 20px;
-            box-sizing: border-box;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            background: var(--card-bg);
-            box-shadow: 0 8px 16px rgba(0,0,0,0.1);
-            transition: all 0.3s ease;
-        }
-
-        .card-front {
-            background: linear-gradient(135deg, var(--gradient-start), var(--gradient-end));
-            color: white;
-        }
-
-        .card-back {
-            background: linear-gradient(135deg, var(--gradient-end), var(--gradient-start));
-            color: white;
-            transform: rotateY(180deg);
-        }
-
-        .card-content {
-            width: 100%;
-            height: 100%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            text-align: center;
-            word-wrap: break-word;
-            overflow-wrap: break-word;
-        }
-
-        .card h3 {
-            margin: 0;
-            font-size: 1.2em;
-            line-height: 1.4;
-            max-width: 100%;
-            color: white;
-        }
-
-        /* File uploader styling */
-        .stFileUploader > div {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            border: 2px solid var(--accent-color);
-        }
-
-        /* Text area styling */
-        .stTextArea > div > div {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            border: 2px solid var(--accent-color);
-        }
-
-        /* Slider container styling */
-        .stSlider > div {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            margin: 0.5rem 0;
-            border: 2px solid var(--accent-color);
-        }
-
-        /* Slider track */
-        .stSlider > div > div > div {
-            height: 4px;
-            border-radius: 2px;
-            background: linear-gradient(to right, var(--gradient-start), var(--gradient-end));
-        }
-
-        /* Slider thumb */
-        .stSlider > div > div > div > div {
-            background-color: var(--primary-color);
-            border: 2px solid white;
-            box-shadow: 0 0 5px rgba(0,0,0,0.2);
-        }
-
-        /* Radio button styling */
-        .stRadio > div {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            border: 2px solid var(--accent-color);
-        }
+# Function to read the custom CSS for enhanced styling from static/style.css (once per process)
+@functools.cache
+def load_css():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css"), encoding="utf-8") as f:
+        return f.read()
 
-        /* Export buttons styling */
-        .export-button {
-            background: linear-gradient(135deg, var(--gradient-start), var(--gradient-end));
-            color: white !important;
-            border: none;
-            padding: 0.5rem 1rem;
-            border-radius: 5px;
-            margin: 0.5rem 0;
-            width: 100%;
-            transition: all 0.3s ease;
-        }
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
-        .export-button:hover {
-            background: linear-gradient(135deg, var(--gradient-end), var(--gradient-start));
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-        }
-
-        /* Text color for all elements */
-        .stMarkdown, .stText, .stTextInput, .stTextArea {
-            color: var(--text-color);
-        }
-
-        /* Ensure text is visible in all states */
-        .stButton > button, .stRadio > div, .stSlider > div, .stTextArea > div > div {
-            color: var(--text-color) !important;
-        }
-
-        /* Radio button text color */
-        .stRadio > div > div > div {
-            color: var(--text-color) !important;
-        }
-
-        /* Slider text color */
-        .stSlider > div > div > div > div > div {
-            color: var(--text-color) !important;
-        }
-
-        @media (min-width: 1200px) {
-            .card-container {
-                grid-template-columns: repeat(3, 1fr);
-            }
-        }
-
-        /* Edit mode styles */
-        .stExpander {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            margin: 0.5rem 0;
-            border: 2px solid var(--accent-color);
-        }
-        
-        .stExpander:hover {
-            border-color: var(--primary-color);
-        }
-        
-        /* Text area styling in edit mode */
-        .stTextArea > div > div {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            border: 2px solid var(--accent-color);
-            min-height: 100px;
-        }
-        
-        /* Delete button styling */
-        .stButton > button[data-testid="baseButton-secondary"] {
-            background-color: #E53E3E !important;
-            color: white !important;
-            border: none;
-            padding: 0.5rem 1rem;
-            border-radius: 5px;
-            transition: all 0.3s ease;
-        }
-        
-        .stButton > button[data-testid="baseButton-secondary"]:hover {
-            background-color: #C53030 !important;
-            transform: translateY(-2px);
-            box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-        }
-        
-        /* Checkbox styling */
-        .stCheckbox > div {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            border: 2px solid var(--accent-color);
-            margin: 1rem 0;
-        }
-
-        /* Language selection styling */
-        .stSelectbox > div {
-            background-color: var(--card-bg);
-            border-radius: 10px;
-            padding: 1rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            border: 2px solid var(--accent-color);
-            margin: 1rem 0;
-        }
-        
-        /* Language indicator */
-        .language-indicator {
-            position: absolute;
-            top: 10px;
-            right: 10px;
-            background-color: var(--primary-color);
-            color: white;
-            padding: 0.25rem 0.5rem;
-            border-radius: 5px;
-            font-size: 0.8rem;
-        }
-    </style>
-""", unsafe_allow_html=True)
-
-# Initialize Together AI API
+# Check the model backends: tasks routed to Together AI need TOGETHER_API_KEY and/or a TOGETHER_API_KEYS pool
 @st.cache_resource
-def init_together():
-    try:
-        api_key = st.secrets["TOGETHER_API_KEY"]
-        return api_key
-    except Exception as e:
-        st.error(f"Error initializing Together AI: {str(e)}")
-        return None
+def init_backends():
+    missing = missing_api_keys()
+    if missing:
+        st.error(f"Error initializing Together AI: no TOGETHER_API_KEY configured (needed for {' and '.join(missing)})")
+        return False
+    return True
 
-api_key = init_together()
-
-# Function to chunk text into smaller pieces
-def chunk_text(text, chunk_size=1000, overlap=100):
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = ' '.join(words[i:i + chunk_size])
-        chunks.append(chunk)
-    return chunks
-
-def generate_with_together(prompt, max_tokens=1024):
-    try:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
-            "prompt": prompt,
-            "max_tokens": max_tokens,
-            "temperature": 0.7,
-            "top_p": 0.9,
-            "top_k": 50,
-            "repetition_penalty": 1.1,
-            "stop": ["</s>", "[INST]"]
-        }
-        
-        print("\nSending request to Together AI...")
-        response = requests.post(
-            "https://api.together.xyz/v1/completions",
-            headers=headers,
-            json=data
-        )
-        
-        if response.status_code == 200:
-            result = response.json()["choices"][0]["text"].strip()
-            print(f"\nTogether AI Response: {result}")
-            return result
-        else:
-            print(f"\nError: {response.status_code}")
-            print(f"Response: {response.text}")
-            return None
-    except Exception as e:
-        print(f"\nError in generate_with_together: {str(e)}")
-        return None
+backends_ready = init_backends()
 
-# Function to generate Q&A pairs for a single chunk
-def generate_qa_for_chunk(chunk, num_questions, difficulty, subject):
-    try:
-        # Prepare the prompt with Llama 3.3's instruction format and subject-specific guidance
-        prompt = f"""<s>[INST] <<SYS>>
-You are a helpful AI assistant that creates educational flashcards for {subject}. Your task is to create exactly {num_questions} {difficulty.lower()} difficulty questions and answers based on the provided text.
+log = get_logger("app")
 
-IMPORTANT: You must format each question and answer pair exactly like this:
-Q: [Your question here]
-A: [Your answer here]
-
-Rules:
-1. Each question must start with "Q: "
-2. Each answer must start with "A: "
-3. Create exactly {num_questions} pairs
-4. Make questions {difficulty.lower()} difficulty
-5. Keep answers concise but informative
-6. Focus on different aspects of the text than the previous questions
-7. Format questions and answers appropriately for {subject}:
-   - For Physics: Include formulas, units, and physical concepts. Use proper scientific notation and SI units.
-   - For Chemistry: Include chemical formulas, equations, and molecular structures. Use proper chemical notation.
-   - For Mathematics: Include formulas, equations, and step-by-step solutions. Use proper mathematical notation.
-   - For Biology: Include scientific terms and concepts
-   - For History: Include dates, events, and historical context
-   - For Computer Science: Include technical terms and programming concepts
-   - For Literature: Include themes, characters, and literary devices
-   - For General: Focus on key concepts and main ideas
-<</SYS>>
-
-Text to analyze: {chunk}
-
-Now create {num_questions} Q&A pairs following the format above, tailored for {subject}. [/INST]</s>"""
-        
-        print(f"\nGenerating Q&A for chunk with prompt: {prompt}")
-        
-        # Generate response using Together AI
-        generated_text = generate_with_together(prompt)
-        if not generated_text:
-            print("\nNo response from Together AI")
-            return []
-            
-        print(f"\nGenerated text: {generated_text}")
-        
-        # Parse Q&A pairs with more robust parsing
-        qa_pairs = []
-        lines = generated_text.split('\n')
-        current_q = None
-        current_a = None
-        
-        print("\nParsing Q&A pairs...")
-        for line in lines:
-            line = line.strip()
-            if not line:  # Skip empty lines
-                continue
-                
-            if line.startswith('Q:'):
-                if current_q and current_a:
-                    print(f"Adding pair: Q: {current_q}, A: {current_a}")
-                    qa_pairs.append({"question": current_q, "answer": current_a})
-                current_q = line[2:].strip()
-            elif line.startswith('A:'):
-                current_a = line[2:].strip()
-            elif current_q and not current_a:  # Handle cases where answer might be on next line without A: prefix
-                current_a = line
-        
-        if current_q and current_a:
-            print(f"Adding final pair: Q: {current_q}, A: {current_a}")
-            qa_pairs.append({"question": current_q, "answer": current_a})
-        
-        print(f"\nTotal Q&A pairs found: {len(qa_pairs)}")
-        
-        # If no pairs were found, try to extract them from the text directly
-        if not qa_pairs and '?' in generated_text:
-            print("\nNo Q&A pairs found, attempting to extract from text...")
-            sentences = generated_text.split('.')
-            for i in range(len(sentences)-1):
-                if '?' in sentences[i]:
-                    qa_pairs.append({
-                        "question": sentences[i].strip(),
-                        "answer": sentences[i+1].strip()
-                    })
-        
-        return qa_pairs
-    except Exception as e:
-        print(f"\nError generating Q&A for chunk: {str(e)}")
-        st.error(f"Error generating Q&A for chunk: {str(e)}")
-        return []
-
-# Function to generate Q&A pairs using parallel processing
-@st.cache_data(ttl=3600)  # Cache results for 1 hour
-def generate_qa_pairs(text, num_questions, difficulty, subject):
-    if not text.strip():
-        st.warning("Please provide some text or upload a file.")
-        return []
-    
-    try:
-        with st.spinner("Generating questions and answers..."):
-            print(f"\nInput text length: {len(text.split())} words")
-            
-            # Ensure text is not too short
-            if len(text.split()) < 50:
-                st.warning("The text is too short. Please provide more content.")
-                return []
-            
-            # If text is too long, truncate it to a reasonable size
-            max_words = 2000  # Maximum words to process
-            words = text.split()
-            if len(words) > max_words:
-                print(f"\nText too long ({len(words)} words), truncating to {max_words} words...")
-                text = " ".join(words[:max_words])
-            
-            # Generate Q&A pairs in a single query
-            print(f"\nGenerating {num_questions} questions...")
-            qa_pairs = generate_qa_for_chunk(text, num_questions, difficulty, subject)
-            
-            print(f"\nTotal Q&A pairs generated: {len(qa_pairs)}")
-            
-            # If we don't have enough pairs, try generating more with a different prompt
-            if len(qa_pairs) < num_questions:
-                print("\nNot enough pairs generated, trying to generate more...")
-                # Try with a different prompt format
-                prompt = f"""<s>[INST] <<SYS>>
-You are a helpful AI assistant that creates educational flashcards for {subject}. Your task is to create exactly {num_questions - len(qa_pairs)} {difficulty.lower()} difficulty questions and answers based on the provided text.
-
-IMPORTANT: You must format each question and answer pair exactly like this:
-Q: [Your question here]
-A: [Your answer here]
-
-Rules:
-1. Each question must start with "Q: "
-2. Each answer must start with "A: "
-3. Create exactly {num_questions - len(qa_pairs)} pairs
-4. Make questions {difficulty.lower()} difficulty
-5. Keep answers concise but informative
-6. Focus on different aspects of the text than the previous questions
-7. Format questions and answers appropriately for {subject}:
-   - For Physics: Include formulas, units, and physical concepts. Use proper scientific notation and SI units.
-   - For Chemistry: Include chemical formulas, equations, and molecular structures. Use proper chemical notation.
-   - For Mathematics: Include formulas, equations, and step-by-step solutions. Use proper mathematical notation.
-   - For Biology: Include scientific terms and concepts
-   - For History: Include dates, events, and historical context
-   - For Computer Science: Include technical terms and programming concepts
-   - For Literature: Include themes, characters, and literary devices
-   - For General: Focus on key concepts and main ideas
-<</SYS>>
-
-Text to analyze: {text}
-
-Now create {num_questions - len(qa_pairs)} Q&A pairs following the format above, tailored for {subject}. [/INST]</s>"""
-                
-                additional_pairs = generate_qa_for_chunk(text, num_questions - len(qa_pairs), difficulty, subject)
-                qa_pairs.extend(additional_pairs)
-            
-            # Shuffle and limit to requested number of questions
-            np.random.shuffle(qa_pairs)
-            final_pairs = qa_pairs[:num_questions]
-            print(f"\nFinal Q&A pairs: {final_pairs}")
-            return final_pairs
-    except Exception as e:
-        print(f"\nError in generate_qa_pairs: {str(e)}")
-        st.error(f"Error generating Q&A pairs: {str(e)}")
-        return []
+# Expose pipeline metrics on a local port when METRICS_PORT is set (once per process)
+start_metrics_server()
 
 # Function to parse uploaded file
-def parse_file(uploaded_file):
+def parse_file(uploaded_file, page_range="", word_budget=None):
     if uploaded_file is None:
         return ""
     try:
-        file_extension = uploaded_file.name.split(".")[-1].lower()
-        if file_extension == "pdf":
-            pdf_reader = PyPDF2.PdfReader(uploaded_file)
-            text = ""
-            total_pages = len(pdf_reader.pages)
-            print(f"\nProcessing PDF with {total_pages} pages...")
-            
-            # Process pages in chunks to avoid memory issues
-            chunk_size = 10  # Process 10 pages at a time
-            for i in range(0, total_pages, chunk_size):
-                end_page = min(i + chunk_size, total_pages)
-                print(f"\nProcessing pages {i+1} to {end_page}...")
-                
-                for page_num in range(i, end_page):
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
-                    if page_text.strip():  # Only add non-empty pages
-                        text += page_text + "\n\n"
-                
-                # If we have enough text for Q&A generation, we can stop
-                if len(text.split()) > 1000:  # Arbitrary threshold
-                    print(f"\nExtracted sufficient text from first {end_page} pages")
-                    break
-            
-            print(f"\nTotal text extracted: {len(text.split())} words")
-            return text
-        elif file_extension == "txt":
-            return uploaded_file.getvalue().decode("utf-8")
-        elif file_extension == "docx":
-            doc = docx.Document(uploaded_file)
-            return " ".join([paragraph.text for paragraph in doc.paragraphs])
-        return ""
+        return extract_file(uploaded_file.getvalue(), uploaded_file.name, page_range, word_budget)["text"]
     except Exception as e:
         st.error(f"Error parsing file: {str(e)}")
         return ""
 
-# Function to export as CSV
-def export_csv(qa_pairs):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Question', 'Answer'])
-    for qa in qa_pairs:
-        writer.writerow([qa['question'], qa['answer']])
-    return output.getvalue()
+# Generation and translation run as background jobs, so reruns (any widget change) don't cancel them
+# While a job is in progress the script polls it by rerunning every POLL_SECONDS
+POLL_SECONDS = 0.5
 
-# Function to export as JSON
-def export_json(qa_pairs):
-    return json.dumps(qa_pairs, indent=2)
+# Function to check whether a job snapshot is still queued or running
+def job_active(job):
+    return job is not None and job["status"] not in (DONE, FAILED)
 
-# Function to export as Anki format
-def export_anki(qa_pairs):
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter='\t')
-    writer.writerow(['Question', 'Answer'])
-    for qa in qa_pairs:
-        writer.writerow([qa['question'], qa['answer']])
-    return output.getvalue()
+# Function to show a finished job's error
+def show_job_error(job, action):
+    if job["expected_error"]:
+        st.warning(job["error"])
+    else:
+        st.error(f"Error {action}: {job['error']}")
+
+# Function to get the translation of a page, translating it in the background
+# Returns the translated cards, or None while the translation is in progress
+def translated_page(page_pairs, target_language):
+    jobs = st.session_state.setdefault("translation_jobs", {})
+    key = (deck_hash(page_pairs), target_language)
+    job = get_job(jobs[key]) if key in jobs else None
+    if job is None:
+        # New page, or a finished job that has expired; cached translations make resubmitting cheap
+        jobs[key] = submit_job("translate", qa_pairs=page_pairs, target_language=target_language)
+        job = get_job(jobs[key])
+    if job["status"] == DONE:
+        return job["result"]
+    if job["status"] == FAILED:
+        show_job_error(job, "translating")
+        return page_pairs
+    st.progress(job["progress"], text=f"Translating to {target_language}...")
+    return None
+
+# Build an export once per deck version (content hash) and format
+# The deck itself is not hashed by Streamlit; the version already identifies it
+@st.cache_data(max_entries=32)
+def cached_export(version, export_format, bundle_formats, _qa_pairs):
+    if export_format == "bundle":
+        return export_bundle(_qa_pairs, bundle_formats), "flashcards.zip", "application/zip"
+    export = EXPORT_FORMATS[export_format]
+    return export_bytes(_qa_pairs, export_format), "flashcards" + export["suffix"], export["mime"]
+
+LANGUAGES = ["English", "Spanish", "French", "German", "Chinese", "Japanese", "Korean", "Russian", "Arabic", "Hindi"]
+PAGE_SIZES = [12, 24, 48, 96]
+EXPORT_LABELS = {
+    "csv": "📊 CSV",
+    "anki": "📝 Anki (text)",
+    "apkg": "🗂️ Anki deck (.apkg)",
+    "json": "🔷 JSON",
+    "jsonl": "🧾 JSONL",
+    "quizlet": "📚 Quizlet",
+    "parquet": "📈 Parquet",
+}
+
+# Function to escape card text for HTML, keeping line breaks
+def card_text_html(text):
+    return html.escape(text).replace("\n", "<br>")
+
+# Function to build the HTML for a single flippable card
+# (kept on one line: blank or indented lines would end the markdown HTML block)
+def card_html(qa):
+    return (
+        '<div class="card"><div class="card-inner">'
+        f'<div class="card-front"><div class="card-content"><h3>{card_text_html(qa["question"])}</h3></div></div>'
+        f'<div class="card-back"><div class="card-content"><h3>{card_text_html(qa["answer"])}</h3></div></div>'
+        '</div></div>'
+    )
 
-# Function to export as Quizlet format
-def export_quizlet(qa_pairs):
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=',')
-    writer.writerow(['Term', 'Definition'])
-    for qa in qa_pairs:
-        writer.writerow([qa['question'], qa['answer']])
-    return output.getvalue()
+# Function to build the HTML for a grid of cards, sent as a single element
+def cards_grid_html(qa_pairs):
+    return '<div class="card-container">' + "".join(card_html(qa) for qa in qa_pairs) + '</div>'
 
-# Add language selection and translation functions
-def translate_qa_pairs(qa_pairs, target_language):
-    try:
-        # Prepare all Q&A pairs in a single prompt
-        qa_text = "\n\n".join([f"Q: {qa['question']}\nA: {qa['answer']}" for qa in qa_pairs])
-        
-        prompt = f"""<s>[INST] <<SYS>>
-You are a helpful AI assistant that translates educational flashcards. Translate the following Q&A pairs to {target_language}.
-Maintain the same format with "Q:" and "A:" prefixes, and preserve the educational content while making it natural in {target_language}.
-<</SYS>>
+# Function to pick the slice of the deck shown on the current page
+def paginate(total_cards):
+    if total_cards <= PAGE_SIZES[0]:
+        return 0, total_cards
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox("🗂️ Cards per page", PAGE_SIZES, key="page_size")
+    page_count = math.ceil(total_cards / page_size)
+    # The page lives in session state only (no widget default), so clamping it does not conflict with the widget
+    st.session_state.setdefault("page", 1)
+    # Keep the page in range after the deck shrinks or the page size grows
+    if st.session_state.page > page_count:
+        st.session_state.page = page_count
+    with col2:
+        page = st.number_input(f"📄 Page (of {page_count})", min_value=1, max_value=page_count, key="page")
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total_cards)
 
-Q&A pairs to translate:
-{qa_text}
+# Function to apply an edited card to the deck; as a widget callback it runs before the script,
+# so the sidebar (drawn first) already exports the edited deck
+def update_card(i):
+    qa = st.session_state.qa_pairs[i]
+    st.session_state.qa_pairs[i] = dict(qa, question=st.session_state[f"q_{i}"], answer=st.session_state[f"a_{i}"])
 
-Translate all pairs to {target_language}, maintaining the Q: and A: format: [/INST]</s>"""
-        
-        print(f"\nTranslating {len(qa_pairs)} Q&A pairs to {target_language}...")
-        translated_text = generate_with_together(prompt)
-        
-        if not translated_text:
-            print("\nNo translation received")
-            return qa_pairs
-            
-        print(f"\nTranslated text: {translated_text}")
-        
-        # Parse the translated Q&A pairs
-        translated_pairs = []
-        current_q = None
-        current_a = None
-        
-        for line in translated_text.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-                
-            if line.startswith('Q:'):
-                if current_q and current_a:
-                    translated_pairs.append({
-                        "question": current_q,
-                        "answer": current_a
-                    })
-                current_q = line[2:].strip()
-            elif line.startswith('A:'):
-                current_a = line[2:].strip()
-            elif current_q and not current_a:
-                current_a = line
-        
-        if current_q and current_a:
-            translated_pairs.append({
-                "question": current_q,
-                "answer": current_a
-            })
-        
-        print(f"\nTranslated {len(translated_pairs)} pairs")
-        return translated_pairs if translated_pairs else qa_pairs
-        
-    except Exception as e:
-        print(f"\nError in translation: {str(e)}")
-        return qa_pairs
-
-# Function to render flippable cards
+# Function to render flippable cards; returns True while a translation is still running
 def render_flippable_cards(qa_pairs):
     if not qa_pairs:
-        print("\nNo Q&A pairs to render")
-        return
-        
-    print(f"\nRendering {len(qa_pairs)} cards")
+        return False
     
     # Add language selection
     col1, col2 = st.columns(2)
@@ -705,63 +172,44 @@ def render_flippable_cards(qa_pairs):
     with col2:
         target_language = st.selectbox(
             "🌐 Language",
-            ["English", "Spanish", "French", "German", "Chinese", "Japanese", "Korean", "Russian", "Arabic", "Hindi"],
+            LANGUAGES,
             help="Select the language for the flashcards"
         )
     
-    # Translate if not English
-    if target_language != "English":
-        with st.spinner(f"Translating to {target_language}..."):
-            qa_pairs = translate_qa_pairs(qa_pairs, target_language)
+    # Only the cards on the current page are translated and rendered
+    start, end = paginate(len(qa_pairs))
     
     if edit_mode:
-        # Create an editable interface
+        # Edit the deck itself (the version that gets exported), one page at a time
         st.subheader("📝 Review and Edit Q&A Pairs")
-        for i, qa in enumerate(qa_pairs):
+        for i in range(start, end):
+            qa = qa_pairs[i]
             with st.expander(f"Q&A Pair {i+1}", expanded=True):
                 col1, col2 = st.columns(2)
                 with col1:
-                    new_question = st.text_area("Question", qa['question'], key=f"q_{i}")
+                    st.text_area("Question", qa['question'], key=f"q_{i}", on_change=update_card, args=(i,))
                 with col2:
-                    new_answer = st.text_area("Answer", qa['answer'], key=f"a_{i}")
-                
-                # Update the Q&A pair if modified
-                if new_question != qa['question'] or new_answer != qa['answer']:
-                    qa_pairs[i] = {"question": new_question, "answer": new_answer}
+                    st.text_area("Answer", qa['answer'], key=f"a_{i}", on_change=update_card, args=(i,))
                 
                 # Add delete button
                 if st.button("🗑️ Delete", key=f"del_{i}"):
                     qa_pairs.pop(i)
                     st.rerun()
     else:
-        # Create the cards container
-        st.markdown('<div class="card-container">', unsafe_allow_html=True)
+        page_pairs = qa_pairs[start:end]
         
-        # Add each card
-        for i, qa in enumerate(qa_pairs):
-            print(f"\nRendering card {i+1}:")
-            print(f"Question: {qa['question']}")
-            print(f"Answer: {qa['answer']}")
-            card_html = f"""
-            <div class="card">
-                <div class="card-inner">
-                    <div class="card-front">
-                        <div class="card-content">
-                            <h3>{qa['question']}</h3>
-                        </div>
-                    </div>
-                    <div class="card-back">
-                        <div class="card-content">
-                            <h3>{qa['answer']}</h3>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            """
-            st.markdown(card_html, unsafe_allow_html=True)
+        # Translate if not English; the original cards are shown until the translation is ready
+        if target_language != "English":
+            translated = translated_page(page_pairs, target_language)
+            if translated is None:
+                with span("render"):
+                    st.markdown(cards_grid_html(page_pairs), unsafe_allow_html=True)
+                return True
+            page_pairs = translated
         
-        # Close the container
-        st.markdown('</div>', unsafe_allow_html=True)
+        with span("render"):
+            st.markdown(cards_grid_html(page_pairs), unsafe_allow_html=True)
+    return False
 
 # Title with emoji
 st.title("✨ FlashForge-AI ✨")
@@ -792,56 +240,32 @@ with st.sidebar:
     # Export options (only shown if cards are generated)
     if st.session_state.qa_pairs:
         st.header("📤 Export Flash Cards")
-        st.markdown("Choose a format to export your flash cards:")
         
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("📊 CSV", use_container_width=True):
-                csv_data = export_csv(st.session_state.qa_pairs)
-                st.download_button(
-                    "Download CSV",
-                    csv_data,
-                    "flashcards.csv",
-                    "text/csv",
-                    use_container_width=True
-                )
-            
-            if st.button("📝 Anki", use_container_width=True):
-                anki_data = export_anki(st.session_state.qa_pairs)
-                st.download_button(
-                    "Download Anki",
-                    anki_data,
-                    "flashcards.txt",
-                    "text/plain",
-                    use_container_width=True
-                )
-        
-        with col2:
-            if st.button("🔷 JSON", use_container_width=True):
-                json_data = export_json(st.session_state.qa_pairs)
-                st.download_button(
-                    "Download JSON",
-                    json_data,
-                    "flashcards.json",
-                    "application/json",
-                    use_container_width=True
-                )
-            
-            if st.button("📚 Quizlet", use_container_width=True):
-                quizlet_data = export_quizlet(st.session_state.qa_pairs)
-                st.download_button(
-                    "Download Quizlet",
-                    quizlet_data,
-                    "flashcards.csv",
-                    "text/csv",
-                    use_container_width=True
-                )
+        # Exports are built once per deck version and format; the download button stays put across reruns
+        export_formats = [fmt for fmt in EXPORT_LABELS if fmt != "parquet" or parquet_available()]
+        export_format = st.selectbox(
+            "Choose a format to export your flash cards:",
+            export_formats + ["bundle"],
+            format_func=lambda fmt: EXPORT_LABELS.get(fmt, "📦 All formats (.zip)"),
+            key="export_format"
+        )
+        data, file_name, mime = cached_export(deck_hash(st.session_state.qa_pairs), export_format, tuple(export_formats), st.session_state.qa_pairs)
+        st.download_button(
+            "⬇️ Download",
+            data,
+            file_name,
+            mime,
+            key="export_download",
+            use_container_width=True
+        )
 
 # Main content area
 # File uploader
 st.subheader("📁 Upload a file")
 uploaded_file = st.file_uploader("Choose a file (PDF, TXT, DOCX)", type=["pdf", "txt", "docx"])
+page_range = ""
+if uploaded_file and uploaded_file.name.lower().endswith(".pdf"):
+    page_range = st.text_input("📄 Pages", placeholder="All pages (e.g. 1-5, 8, 10-)", help="Only extract these pages from the PDF")
 
 # Text input
 st.subheader("✍️ Or enter text directly")
@@ -850,14 +274,38 @@ text_input = st.text_area("", height=200, placeholder="Enter your text here...")
 # Generate button
 if st.button("🎲 Generate Flash Cards", type="primary", use_container_width=True):
     # Parse uploaded file or use text input
-    input_text = parse_file(uploaded_file) if uploaded_file else text_input
+    input_text = parse_file(uploaded_file, page_range) if uploaded_file else text_input
     
-    # Generate Q&A pairs
-    st.session_state.qa_pairs = generate_qa_pairs(input_text, num_questions, difficulty, subject)
+    # Generate Q&A pairs in the background; the job id survives reruns
+    st.session_state.generate_job = submit_job(
+        "generate", text=input_text, num_questions=num_questions, difficulty=difficulty, subject=subject
+    )
+
+# Poll the generation job
+generate_job = get_job(st.session_state.generate_job) if st.session_state.get("generate_job") else None
+if generate_job is not None and not job_active(generate_job):
+    del st.session_state.generate_job
+    if generate_job["status"] == DONE:
+        st.session_state.qa_pairs = generate_job["result"]
+        # Rerun so the sidebar (already drawn) offers the new deck for export
+        st.rerun()
+    show_job_error(generate_job, "generating Q&A pairs")
 
 # Display cards
-if api_key is not None:
-    # Display flippable cards
-    render_flippable_cards(st.session_state.qa_pairs)
-else:
-    st.error("Failed to load the model. Please try refreshing the page.") 
\ No newline at end of file
+if not backends_ready:
+    st.error("Failed to load the model. Please try refreshing the page.")
+elif job_active(generate_job):
+    # Show cards as they stream in, before the full response is done
+    message = "Generating questions and answers..."
+    # Tell the user when their requests will queue behind others
+    wait = estimate_wait() if not generate_job["partial"] else 0
+    if wait >= 1:
+        message += f" (about {wait:.0f}s in queue)"
+    st.progress(generate_job["progress"], text=message)
+    st.markdown(cards_grid_html(generate_job["partial"]), unsafe_allow_html=True)
+    time.sleep(POLL_SECONDS)
+    st.rerun()
+elif render_flippable_cards(st.session_state.qa_pairs):
+    # Display flippable cards, polling while a translation runs
+    time.sleep(POLL_SECONDS)
+    st.rerun() 
\ No newline at end of file
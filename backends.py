@@ -0,0 +1,122 @@
+import functools
+
+from settings import get_api_keys, get_setting
+from chunking import count_tokens
+from metrics import get_logger, metrics, span
+from scheduler import RequestScheduler
+from together import CircuitBreaker, Endpoint, get_together_endpoint
+
+log = get_logger("backends")
+
+BACKENDS = ("together", "openai", "fake")
+
+# Tasks that can be routed to their own backend and model
+TASKS = ("generation", "translation")
+
+# Standard OpenAI sampling parameters; local servers do not all accept Together's extras
+OPENAI_SAMPLING = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "stop": ["</s>", "[INST]"]
+}
+
+# Deterministic model answering from canned cards, for tests and offline runs
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, scheduler):
+        self.model = "fake"
+        self.scheduler = scheduler
+        self.canned = None
+
+    def generate(self, prompt, max_tokens=1024, response_format=None):
+        from fake_llm import completion_text, load_canned_cards
+
+        if self.canned is None:
+            self.canned = load_canned_cards()
+        with self.scheduler.slot(count_tokens(prompt) + max_tokens), span("http"):
+            text = completion_text({"prompt": prompt, "response_format": response_format}, self.canned)
+        metrics.inc("flashforge_http_requests_total", status=200, backend=self.name)
+        return text
+
+    def stream(self, prompt, max_tokens=1024, response_format=None):
+        text = self.generate(prompt, max_tokens, response_format)
+        for i in range(0, len(text), 16):
+            yield text[i:i + 16]
+
+# Function to get the scheduler of an OpenAI-compatible server (e.g. llama.cpp or vLLM), which may need no key
+@functools.cache
+def get_openai_scheduler():
+    return RequestScheduler(
+        [get_setting("OPENAI_API_KEY", "")],
+        requests_per_minute=get_setting("OPENAI_RPM", 600),
+        tokens_per_minute=get_setting("OPENAI_TPM", 1000000),
+        max_concurrency=get_setting("OPENAI_MAX_CONCURRENCY", 2),
+        max_queue=get_setting("SCHEDULER_MAX_QUEUE", 64),
+        max_wait=get_setting("SCHEDULER_MAX_WAIT", 120.0)
+    )
+
+@functools.cache
+def get_openai_circuit_breaker():
+    return CircuitBreaker(
+        failure_threshold=get_setting("OPENAI_BREAKER_THRESHOLD", 5),
+        reset_timeout=get_setting("OPENAI_BREAKER_RESET", 30.0)
+    )
+
+# Function to get an OpenAI-compatible endpoint for a model (OPENAI_MODEL by default)
+@functools.cache
+def get_openai_endpoint(model=None):
+    return Endpoint(
+        "openai",
+        get_setting("OPENAI_BASE_URL", "http://127.0.0.1:8000/v1").rstrip("/") + "/completions",
+        model or get_setting("OPENAI_MODEL", "local-model"),
+        get_openai_scheduler(),
+        get_openai_circuit_breaker(),
+        OPENAI_SAMPLING
+    )
+
+@functools.cache
+def get_fake_backend():
+    return FakeBackend(RequestScheduler(
+        [""],
+        requests_per_minute=100000,
+        tokens_per_minute=100000000,
+        max_concurrency=get_setting("FAKE_MAX_CONCURRENCY", 8)
+    ))
+
+# Function to get a backend by name, with an optional model (backends without models ignore it)
+def get_backend(name, model=None):
+    if name == "together":
+        return get_together_endpoint(model)
+    if name == "openai":
+        return get_openai_endpoint(model)
+    if name == "fake":
+        return get_fake_backend()
+    raise ValueError(f"Unknown backend {name!r}, expected one of {', '.join(BACKENDS)}")
+
+# Function to get the backend and model for a task, from e.g. GENERATION_BACKEND and GENERATION_MODEL
+# An empty model uses the backend's default, so e.g. translation can run on a smaller model than generation
+@functools.cache
+def route(task):
+    prefix = task.upper()
+    backend = get_backend(get_setting(f"{prefix}_BACKEND", "together"), get_setting(f"{prefix}_MODEL", "") or None)
+    log.info("Routing %s to %s (%s)", task, backend.name, backend.model)
+    return backend
+
+# Function to generate a completion for a task on its backend
+def complete(prompt, max_tokens=1024, response_format=None, task="generation"):
+    return route(task).generate(prompt, max_tokens, response_format)
+
+# Function to stream a completion for a task on its backend
+def stream_complete(prompt, max_tokens=1024, response_format=None, task="generation"):
+    return route(task).stream(prompt, max_tokens, response_format)
+
+# Function to list tasks that route to Together AI while no Together AI key is configured
+def missing_api_keys():
+    if get_api_keys():
+        return []
+    return [task for task in TASKS if get_setting(f"{task.upper()}_BACKEND", "together") == "together"]
+
+# Function to estimate the queueing delay for a new generation request, e.g. for the UI
+def estimate_wait(tokens=2000):
+    return route("generation").scheduler.estimate_wait(tokens)
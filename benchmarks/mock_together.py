@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fake_llm import completion_text, load_canned_cards
+
+# Stand-in for the Together AI completions endpoint
+class MockTogetherHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        config = self.server.config
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.prompt_tokens += len(body.get("prompt", "")) // 4
+            failed = self.server.rng.random() < config["error_rate"]
+            delay = max(0.0, self.server.rng.gauss(config["latency"], config["jitter"]))
+        time.sleep(delay)
+
+        if failed:
+            status = random.choice([429, 503])
+            self.send_json(status, {"error": {"message": "mock failure"}}, {"Retry-After": "0"})
+            return
+
+        text = completion_text(body, self.server.canned)
+        usage = {"prompt_tokens": len(body.get("prompt", "")) // 4, "completion_tokens": len(text) // 4}
+        if not body.get("stream"):
+            self.send_json(200, {"choices": [{"text": text}], "usage": usage})
+            return
+
+        # Server-sent events, a few characters per event
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = config["stream_chunk"]
+        for i in range(0, len(text), step):
+            event = {"choices": [{"text": text[i:i + step]}]}
+            if i + step >= len(text):
+                event["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(config["stream_delay"])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to start the mock server in a background thread
+def start_mock_server(port=0, latency=0.05, jitter=0.01, error_rate=0.0, stream_delay=0.002, stream_chunk=16, seed=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockTogetherHandler)
+    server.daemon_threads = True
+    server.config = {
+        "latency": latency, "jitter": jitter, "error_rate": error_rate,
+        "stream_delay": stream_delay, "stream_chunk": stream_chunk
+    }
+    server.canned = load_canned_cards()
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.prompt_tokens = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Together AI completions endpoint.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429/503")
+    parser.add_argument("--stream-delay", type=float, default=0.002, help="seconds between streamed events")
+    args = parser.parse_args(argv)
+
+    server = start_mock_server(args.port, args.latency, args.jitter, args.error_rate, args.stream_delay)
+    print(f"Mock Together AI listening on http://127.0.0.1:{server.server_address[1]}/v1/completions")
+    print("Point the app at it with TOGETHER_API_URL; press Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import platform
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Function to configure the pipeline for an isolated, offline run (before it is imported)
+def configure_environment(api_url):
+    os.environ["TOGETHER_API_URL"] = api_url
+    os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+    # Persistent caches would turn every run after the first into cache hits
+    for name in ("LLM_CACHE_PATH", "TEXT_CACHE_PATH", "TRANSLATION_CACHE_PATH"):
+        os.environ[name] = ""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Measure the pipeline, not the client-side rate limits
+    os.environ.setdefault("TOGETHER_RPM", "1000000")
+    os.environ.setdefault("TOGETHER_TPM", "1000000000")
+    sys.path.insert(0, ROOT)
+    # Settings come from the environment only, so a local secrets.toml cannot point the run at the real API
+    import settings
+
+    settings.SECRETS_PATHS.clear()
+    settings.load_secrets.cache_clear()
+
+# Function to reset in-memory caches so every iteration does the full work
+def clear_caches():
+    import caches
+
+    caches.get_text_cache.cache_clear()
+    caches.get_translation_cache.cache_clear()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+# Function to time a benchmark; func returns the number of items processed (cards, pages, ...)
+# Fast benchmarks are repeated until min_time has passed, which keeps their percentiles stable
+def measure(name, func, iterations, unit, min_time=1.0, max_iterations=500):
+    func()  # warm-up: imports, process pools, HTTP connections
+    latencies = []
+    items = 0
+    while len(latencies) < iterations or (sum(latencies) < min_time and len(latencies) < max_iterations):
+        clear_caches()
+        start = time.perf_counter()
+        items += func()
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {
+        "name": name,
+        "iterations": len(latencies),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "throughput": items / total if total else 0.0,
+        "unit": f"{unit}/s",
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+# Function to build a deck of the given size from the canned cards
+def make_deck(size):
+    from fake_llm import load_canned_cards
+
+    canned = load_canned_cards()
+    return [
+        {"question": f"{qa['question']} ({i})", "answer": qa["answer"], "source_chunk": i % 7}
+        for i, qa in ((i, canned[i % len(canned)]) for i in range(size))
+    ]
+
+# Function to define the benchmarks: name -> (function returning an item count, unit)
+def define_benchmarks(deck_sizes, export_size):
+    from pipeline import EXPORT_FORMATS, export_bytes, generate_qa_pairs, parquet_available, translate_qa_pairs
+    from documents import extract_document
+
+    with open(os.path.join(ROOT, "leph204.pdf"), "rb") as f:
+        pdf_bytes = f.read()
+    with open(os.path.join(ROOT, "sample_text.txt"), "rb") as f:
+        txt_bytes = f.read()
+    pdf_text = extract_document(pdf_bytes, "pdf")["text"]
+    txt_text = txt_bytes.decode("utf-8")
+
+    def parse(file_bytes, extension):
+        return lambda: len(extract_document(file_bytes, extension)["page_offsets"])
+
+    def generate(text, size, stream=False):
+        on_card = (lambda qa: None) if stream else None
+        return lambda: len(generate_qa_pairs(text, size, "Medium", "Physics", on_card))
+
+    benchmarks = {
+        "parse_file[leph204.pdf]": (parse(pdf_bytes, "pdf"), "pages"),
+        "parse_file[sample_text.txt]": (parse(txt_bytes, "txt"), "files"),
+    }
+    for size in deck_sizes:
+        benchmarks[f"generate_qa_pairs[sample_text, n={size}]"] = (generate(txt_text, size), "cards")
+    benchmarks[f"generate_qa_pairs[sample_text, n={deck_sizes[-1]}, streaming]"] = (generate(txt_text, deck_sizes[-1], True), "cards")
+    benchmarks[f"generate_qa_pairs[leph204.pdf, n={deck_sizes[-1]}]"] = (generate(pdf_text, deck_sizes[-1]), "cards")
+
+    translation_deck = make_deck(deck_sizes[-1])
+    benchmarks[f"translate_qa_pairs[n={len(translation_deck)}]"] = (
+        lambda: len(translate_qa_pairs(translation_deck, "Spanish")), "cards"
+    )
+
+    export_deck = make_deck(export_size)
+    for fmt in EXPORT_FORMATS:
+        if fmt == "parquet" and not parquet_available():
+            continue
+        benchmarks[f"export[{fmt}, n={export_size}]"] = (
+            (lambda fmt=fmt: len(export_bytes(export_deck, fmt)) and len(export_deck)), "cards"
+        )
+    return benchmarks
+
+# Function to compare results with a baseline; returns the names that regressed
+def compare(results, baseline, tolerance, min_delta_ms):
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    print(f"\n{'benchmark':<52} {'p50 ms':>9} {'p95 ms':>9} {'throughput':>16} {'RSS MB':>8} {'vs base':>8} {'prompt tok':>11} {'vs base':>8}")
+    for result in results:
+        change = ""
+        base = previous.get(result["name"])
+        if base and base["p50_ms"] > 0:
+            ratio = result["p50_ms"] / base["p50_ms"] - 1
+            change = f"{ratio:+.0%}"
+            if ratio > tolerance and result["p50_ms"] - base["p50_ms"] > min_delta_ms:
+                regressions.append(result["name"])
+                change += " !"
+        # Prompt tokens sent per call, e.g. to check what prompt layout or retrieval changes save
+        tokens = result.get("prompt_tokens", 0)
+        token_change = ""
+        if base and base.get("prompt_tokens") and tokens:
+            token_change = f"{tokens / base['prompt_tokens'] - 1:+.0%}"
+        throughput = f"{result['throughput']:.1f} {result['unit']}"
+        print(
+            f"{result['name']:<52} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {throughput:>16} "
+            f"{result['peak_rss_mb']:>8.0f} {change:>8} {tokens or '':>11} {token_change:>8}"
+        )
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local mock of the Together AI API.")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--deck-sizes", default="5,10,20", help="comma-separated numbers of questions to generate")
+    parser.add_argument("--export-size", type=int, default=5000, help="cards per deck in the export benchmarks")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock API latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock API requests that fail with 429/503")
+    parser.add_argument("--stream-delay", type=float, default=0.002, help="seconds between streamed events")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before a benchmark counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="slowdowns smaller than this are never regressions")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.mock_together import start_mock_server
+
+    server = start_mock_server(latency=args.latency, error_rate=args.error_rate, stream_delay=args.stream_delay)
+    configure_environment(f"http://127.0.0.1:{server.server_address[1]}/v1/completions")
+
+    deck_sizes = [int(size) for size in args.deck_sizes.split(",") if size.strip()]
+    benchmarks = define_benchmarks(deck_sizes, args.export_size)
+    results = []
+    for name, (func, unit) in benchmarks.items():
+        if args.filter in name:
+            print(f"Running {name}...", flush=True)
+            sent = server.prompt_tokens
+            result = measure(name, func, args.iterations, unit)
+            # Every call does the same work, so prompt tokens per call are exact (warm-up included)
+            result["prompt_tokens"] = (server.prompt_tokens - sent) // (result["iterations"] + 1)
+            results.append(result)
+
+    report = {
+        "settings": {
+            "iterations": args.iterations, "latency": args.latency, "error_rate": args.error_rate,
+            "stream_delay": args.stream_delay, "export_size": args.export_size
+        },
+        "mock_requests": server.requests,
+        "results": results
+    }
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("\nNote: baseline was recorded with different settings")
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    print(f"\nMock API requests: {server.requests}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
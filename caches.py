@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import functools
+from collections import OrderedDict
+
+from settings import get_setting
+from metrics import get_logger, metrics
+
+log = get_logger("caches")
+
+# Disk-backed LLM response cache keyed by a hash of the normalized request
+class ResponseCache:
+    def __init__(self, path, max_bytes, ttl, name="llm"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(data):
+        # Whitespace in the prompt does not change the request, so it is not part of the key
+        params = {k: v for k, v in data.items() if k != "stream"}
+        params["prompt"] = " ".join(params.get("prompt", "").split())
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                metrics.inc("flashforge_cache_requests_total", cache=self.name, result="miss")
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            metrics.inc("flashforge_cache_requests_total", cache=self.name, result="hit")
+            return row[0]
+
+    def set(self, key, response):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now)
+            )
+            self.evict(now)
+            self.conn.commit()
+
+    def evict(self, now):
+        # Drop expired entries, then least recently used ones until under the size limit
+        self.conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size
+        }
+
+@functools.cache
+def get_response_cache():
+    path = get_setting("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3"))
+    if not path:
+        return None
+    try:
+        return ResponseCache(
+            path,
+            max_bytes=get_setting("LLM_CACHE_MAX_MB", 200) * 1024 * 1024,
+            ttl=get_setting("LLM_CACHE_TTL_HOURS", 24 * 7) * 3600
+        )
+    except Exception as e:
+        log.error("Error opening LLM response cache: %s", e)
+        return None
+
+# In-memory LRU cache bounded by the total size of its values
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def set(self, key, value, size):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+# Two-tier cache: in-memory LRU in front of an optional on-disk SQLite store
+class TieredCache:
+    def __init__(self, memory_bytes, path=None, max_bytes=0, ttl=0, name="cache"):
+        self.memory = LRUCache(memory_bytes)
+        self.name = name
+        self.disk = None
+        if path:
+            try:
+                self.disk = ResponseCache(path, max_bytes=max_bytes, ttl=ttl, name=f"{name}_disk")
+            except Exception as e:
+                log.error("Error opening cache at %s: %s", path, e)
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            cached = self.disk.get(key)
+            if cached is not None:
+                value = json.loads(cached)
+                self.memory.set(key, value, len(cached))
+        metrics.inc("flashforge_cache_requests_total", cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def set(self, key, value, persist=True):
+        serialized = json.dumps(value)
+        self.memory.set(key, value, len(serialized))
+        if self.disk is not None and persist:
+            self.disk.set(key, serialized)
+
+# Extracted document text, cached in memory and optionally on disk
+@functools.cache
+def get_text_cache():
+    return TieredCache(
+        get_setting("TEXT_CACHE_MEMORY_MB", 64) * 1024 * 1024,
+        path=get_setting("TEXT_CACHE_PATH", os.path.join(".cache", "extracted_text.sqlite3")),
+        max_bytes=get_setting("TEXT_CACHE_MAX_MB", 500) * 1024 * 1024,
+        ttl=get_setting("TEXT_CACHE_TTL_HOURS", 24 * 30) * 3600,
+        name="text"
+    )
+
+# Translated cards keyed by (card hash, target language)
+@functools.cache
+def get_translation_cache():
+    return TieredCache(
+        get_setting("TRANSLATION_CACHE_MEMORY_MB", 16) * 1024 * 1024,
+        path=get_setting("TRANSLATION_CACHE_PATH", os.path.join(".cache", "translations.sqlite3")),
+        max_bytes=get_setting("TRANSLATION_CACHE_MAX_MB", 100) * 1024 * 1024,
+        ttl=get_setting("TRANSLATION_CACHE_TTL_HOURS", 24 * 30) * 3600,
+        name="translation"
+    )
@@ -0,0 +1,119 @@
+import re
+import functools
+
+from settings import get_setting
+from metrics import timed
+
+# Load a BPE tokenizer when tiktoken is installed; otherwise tokens are estimated
+@functools.cache
+def get_tokenizer():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+TOKEN_PIECES = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]|_")
+
+PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+COVERAGE_WORDS = re.compile(r"[^\W\d_]{4,}")
+
+# Function to count the tokens in a text
+def count_tokens(text):
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, disallowed_special=()))
+    # Heuristic: short words are one token, long words split every ~6 letters,
+    # and each digit group or symbol (common in formulas) is its own token
+    count = 0
+    for piece in TOKEN_PIECES.findall(text):
+        count += (len(piece) + 5) // 6 if piece[0].isalpha() else 1
+    return count
+
+# Function to size the completion for the requested number of cards
+def completion_tokens_for(num_questions):
+    return min(get_setting("MAX_COMPLETION_TOKENS", 4096), num_questions * get_setting("TOKENS_PER_CARD", 90) + 64)
+
+# Function to split text into sentence-sized units of at most max_tokens
+def text_units(text, max_tokens):
+    units = []
+    for paragraph in PARAGRAPH_SPLIT.split(text):
+        for sentence in SENTENCE_SPLIT.split(paragraph.strip()):
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                units.append((sentence, tokens))
+                continue
+            # Oversized sentences are split on word boundaries
+            piece = []
+            piece_tokens = 0
+            for word in sentence.split():
+                word_tokens = count_tokens(word)
+                if piece and piece_tokens + word_tokens > max_tokens:
+                    units.append((" ".join(piece), piece_tokens))
+                    piece = []
+                    piece_tokens = 0
+                piece.append(word)
+                piece_tokens += word_tokens
+            if piece:
+                units.append((" ".join(piece), piece_tokens))
+    return units
+
+# Function to chunk text into pieces that fit a token budget, on sentence boundaries
+@timed("chunk")
+def chunk_text(text, chunk_tokens=None, overlap_tokens=None):
+    if chunk_tokens is None:
+        chunk_tokens = get_setting("CHUNK_TOKENS", 2000)
+    if overlap_tokens is None:
+        overlap_tokens = get_setting("CHUNK_OVERLAP_TOKENS", 150)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit, tokens in text_units(text, chunk_tokens):
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append(" ".join(u for u, _ in current))
+            # Carry the trailing sentences into the next chunk as overlap
+            overlap = []
+            overlap_total = 0
+            for u, t in reversed(current):
+                if overlap_total + t > overlap_tokens:
+                    break
+                overlap.insert(0, (u, t))
+                overlap_total += t
+            current = overlap
+            current_tokens = overlap_total
+            while current and current_tokens + tokens > chunk_tokens:
+                current_tokens -= current.pop(0)[1]
+        current.append((unit, tokens))
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(u for u, _ in current))
+    return chunks
+
+# Function to split the question budget across chunks in proportion to their token count
+def allocate_questions(chunks, num_questions):
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    total = sum(sizes)
+    if not total:
+        return [0] * len(chunks)
+    shares = [size / total * num_questions for size in sizes]
+    counts = [int(share) for share in shares]
+    # Hand out the remainder to the chunks with the largest fractional share
+    remainder = num_questions - sum(counts)
+    for idx in sorted(range(len(chunks)), key=lambda i: counts[i] - shares[i])[:remainder]:
+        counts[idx] += 1
+    return counts
+
+# Function to score how much of each chunk's vocabulary the existing cards cover
+def chunk_coverage(chunks, qa_pairs):
+    covered = set(COVERAGE_WORDS.findall(" ".join(qa["question"] + " " + qa["answer"] for qa in qa_pairs).lower()))
+    scores = []
+    for chunk in chunks:
+        words = set(COVERAGE_WORDS.findall(chunk.lower()))
+        scores.append(len(words & covered) / len(words) if words else 1.0)
+    return scores
@@ -0,0 +1,206 @@
+import os
+import csv
+import sys
+import json
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pipeline import (
+    BATCH,
+    EXPORT_FORMATS,
+    extract_file,
+    generate_qa_pairs,
+    metrics,
+    request_priority,
+    start_metrics_server,
+    translate_qa_pairs,
+    write_export,
+)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".docx")
+
+# Function to collect documents from files and directories
+def find_documents(paths):
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        documents.append({"path": os.path.join(root, name)})
+        else:
+            documents.append({"path": path})
+    return documents
+
+# Function to read a manifest (.json, .jsonl or .csv) of documents and per-document settings
+def read_manifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            entries = list(csv.DictReader(f))
+        elif path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    # Relative paths are resolved against the manifest's directory; entries without one fail in make_job
+    for entry in entries:
+        if entry.get("path"):
+            entry["path"] = os.path.join(base, entry["path"])
+    return [{k: v for k, v in entry.items() if v not in ("", None)} for entry in entries]
+
+# Function to build a job from a document entry and the command-line defaults
+def make_job(entry, args):
+    if not entry.get("path"):
+        raise ValueError("the entry has no 'path'")
+    job = {
+        "path": entry["path"],
+        "name": entry.get("name") or os.path.splitext(os.path.basename(entry["path"]))[0],
+        "subject": entry.get("subject", args.subject),
+        "num_questions": int(entry.get("num_questions", args.num_questions)),
+        "difficulty": entry.get("difficulty", args.difficulty),
+        "language": entry.get("language", args.language),
+        # Manifests may give a single page as a number
+        "pages": str(entry.get("pages", args.pages)),
+    }
+    with open(job["path"], "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    settings = json.dumps([digest, job["subject"], job["num_questions"], job["difficulty"], job["language"], job["pages"]])
+    job["id"] = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+    return job
+
+# Checkpoint of finished jobs, rewritten atomically after every job
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.jobs = json.load(f)
+
+    # A job is done when it finished and wrote every requested output, so a rerun with new formats exports them
+    def is_done(self, job, outputs):
+        entry = self.jobs.get(job["id"])
+        if not entry or entry["status"] != "done":
+            return False
+        return all(p in entry["outputs"] and os.path.exists(p) for p in outputs)
+
+    def record(self, job, status, **details):
+        with self.lock:
+            self.jobs[job["id"]] = dict(details, status=status, path=job["path"])
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.jobs, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+# Function to get the path of a job's export in a format
+def output_path(job, out_dir, fmt):
+    return os.path.join(out_dir, job["name"] + EXPORT_FORMATS[fmt]["suffix"])
+
+# Function to generate, translate and export one deck; returns (cards, output paths, untranslated cards)
+def run_job(job, out_dir, formats):
+    untranslated = 0
+    with open(job["path"], "rb") as f:
+        document = extract_file(f.read(), job["path"], job["pages"])
+    # Batch requests yield to interactive ones when they share the scheduler
+    with request_priority(BATCH):
+        qa_pairs = generate_qa_pairs(document["text"], job["num_questions"], job["difficulty"], job["subject"])
+        if not qa_pairs:
+            raise RuntimeError("No flashcards were generated")
+        if job["language"] != "English":
+            translated = translate_qa_pairs(qa_pairs, job["language"])
+            # Cards that could not be translated come back unchanged (the same objects)
+            untranslated = sum(1 for new, old in zip(translated, qa_pairs) if new is old)
+            qa_pairs = translated
+
+    outputs = []
+    for fmt in formats:
+        path = output_path(job, out_dir, fmt)
+        # Exports are streamed to disk in chunks
+        with open(path, "wb") as f:
+            write_export(qa_pairs, fmt, f, title=job["name"])
+        outputs.append(path)
+    return len(qa_pairs), outputs, untranslated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate flashcard decks for many documents without the UI.")
+    parser.add_argument("paths", nargs="*", help="documents or directories of PDF/TXT/DOCX files")
+    parser.add_argument("--manifest", help="JSON, JSONL or CSV file with a 'path' column and optional per-document settings")
+    parser.add_argument("--out-dir", default="decks", help="directory for exported decks (default: decks)")
+    parser.add_argument("--formats", default="csv,json", help=f"comma-separated export formats: {', '.join(EXPORT_FORMATS)}")
+    parser.add_argument("--subject", default="General")
+    parser.add_argument("--num-questions", type=int, default=10)
+    parser.add_argument("--difficulty", default="Medium", choices=["Easy", "Medium", "Hard"])
+    parser.add_argument("--language", default="English")
+    parser.add_argument("--pages", default="", help="PDF page range, e.g. 1-5, 8")
+    parser.add_argument("--workers", type=int, default=4, help="documents processed concurrently")
+    parser.add_argument("--checkpoint", help="progress file used to resume interrupted runs (default: <out-dir>/.checkpoint.json)")
+    parser.add_argument("--force", action="store_true", help="regenerate decks that are already in the checkpoint")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this local port while running")
+    args = parser.parse_args(argv)
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        parser.error(f"unknown export format(s): {', '.join(unknown)}")
+
+    entries = find_documents(args.paths)
+    if args.manifest:
+        entries.extend(read_manifest(args.manifest))
+    if not entries:
+        parser.error("no documents given")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    start_metrics_server(args.metrics_port)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.out_dir, ".checkpoint.json"))
+
+    jobs = []
+    names = set()
+    invalid = 0
+    for entry in entries:
+        try:
+            job = make_job(entry, args)
+        except (OSError, ValueError) as e:
+            # A missing or unreadable document fails on its own instead of aborting the batch
+            invalid += 1
+            print(f"Failed {entry.get('path') or entry}: {str(e)}")
+            continue
+        # Keep output names unique when documents share a file name
+        if job["name"] in names:
+            job["name"] = f"{job['name']}-{job['id'][:8]}"
+        names.add(job["name"])
+        if not args.force and checkpoint.is_done(job, [output_path(job, args.out_dir, fmt) for fmt in formats]):
+            print(f"Skipping {job['path']} (already done)")
+            continue
+        jobs.append(job)
+
+    print(f"Processing {len(jobs)} of {len(entries)} documents with {args.workers} workers...")
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {executor.submit(run_job, job, args.out_dir, formats): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                cards, outputs, untranslated = future.result()
+                if untranslated:
+                    # Exported in the original language for now; not checkpointed as done, so a resume retries it
+                    failures += 1
+                    checkpoint.record(job, "untranslated", cards=cards, outputs=outputs)
+                    print(f"Incomplete {job['path']}: {untranslated} of {cards} cards could not be translated")
+                else:
+                    checkpoint.record(job, "done", cards=cards, outputs=outputs)
+                    print(f"Done {job['path']}: {cards} cards")
+            except Exception as e:
+                failures += 1
+                checkpoint.record(job, "failed", error=str(e), outputs=[])
+                print(f"Failed {job['path']}: {str(e)}")
+
+    print(f"Finished: {len(jobs) - failures} succeeded, {failures + invalid} failed")
+    for cache, hit_rate in sorted(metrics.cache_hit_rates().items()):
+        print(f"Cache {cache}: {hit_rate:.0%} hit rate")
+    return 1 if failures or invalid else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import re
+import zlib
+
+import numpy as np
+
+from metrics import timed
+
+NORMALIZE = re.compile(r"[^\w\s]")
+MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# Function to normalize card text before shingling
+def normalize_text(text):
+    return " ".join(NORMALIZE.sub(" ", text.lower()).split())
+
+# Function to hash the character 4-gram shingles of a card
+def card_shingles(qa, size=4):
+    text = normalize_text(qa["question"] + " " + qa["answer"])
+    if len(text) <= size:
+        text = text.ljust(size)
+    grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+# Function to compute MinHash signatures for all cards at once
+def minhash_signatures(qa_pairs, num_perm=64, seed=7):
+    rng = np.random.default_rng(seed)
+    # Odd 64-bit multipliers so the product wraps and mixes all input bits
+    a = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+    b = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64, endpoint=False)
+    signatures = np.empty((len(qa_pairs), num_perm), dtype=np.uint64)
+    for i, qa in enumerate(qa_pairs):
+        # Multiply-shift hashing: wraps mod 2**64, the high 32 bits are the permuted value
+        hashed = (np.outer(card_shingles(qa), a) + b) >> np.uint64(32)
+        signatures[i] = hashed.min(axis=0)
+    return signatures
+
+# Function to drop cards that are near duplicates of an earlier card
+@timed("dedup")
+def deduplicate_cards(qa_pairs, threshold=0.6, num_perm=64, bands=16):
+    if len(qa_pairs) < 2:
+        return list(qa_pairs)
+    signatures = minhash_signatures(qa_pairs, num_perm)
+    rows = num_perm // bands
+    # Banded LSH: cards sharing any band bucket are candidates. Only kept cards
+    # are indexed, so each card is compared against a handful of candidates.
+    buckets = [{} for _ in range(bands)]
+    kept = []
+    for i in range(len(qa_pairs)):
+        keys = [signatures[i, band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(buckets[band].get(key, ()))
+        # Fraction of equal MinHash values estimates the Jaccard similarity
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            if (signatures[candidates] == signatures[i]).mean(axis=1).max() >= threshold:
+                continue
+        kept.append(i)
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(i)
+    return [qa_pairs[i] for i in kept]
@@ -0,0 +1,82 @@
+import io
+import os
+import hashlib
+
+from settings import get_setting
+from caches import get_text_cache
+from metrics import get_logger, timed
+
+log = get_logger("documents")
+
+# Function to extract text and per-page start offsets from file bytes
+@timed("extract")
+def extract_document(file_bytes, file_extension, page_range="", word_budget=None):
+    if file_extension == "pdf":
+        # Parsers are imported only when a file of that type is processed
+        from pdf_extract import count_pdf_pages, iter_pdf_pages, parse_page_range
+
+        if word_budget is None:
+            word_budget = get_setting("PDF_WORD_BUDGET", 20000)
+        total_pages = count_pdf_pages(file_bytes)
+        page_numbers = parse_page_range(page_range, total_pages) if page_range.strip() else list(range(total_pages))
+        log.info("Processing %d of %d PDF pages...", len(page_numbers), total_pages)
+        
+        # Pages are extracted in parallel and consumed lazily in page order
+        extracted = []
+        word_count = 0
+        pages = iter_pdf_pages(file_bytes, page_numbers, get_setting("PDF_WORKERS", min(os.cpu_count() or 1, 4)))
+        try:
+            for page_num, page_text in pages:
+                if page_text.strip():  # Only add non-empty pages
+                    extracted.append((page_num, page_text))
+                    word_count += len(page_text.split())
+                
+                # Stop once the word budget is reached
+                if word_count >= word_budget:
+                    log.info("Reached word budget of %d at page %d", word_budget, page_num + 1)
+                    break
+        finally:
+            pages.close()
+        
+        # Running headers, footers and page numbers would otherwise end up in every prompt
+        if get_setting("STRIP_BOILERPLATE", 1):
+            from summarize import strip_boilerplate
+
+            extracted = strip_boilerplate(extracted)
+        
+        parts = []
+        page_offsets = []
+        offset = 0
+        for page_num, page_text in extracted:
+            parts.append(page_text + "\n\n")
+            page_offsets.append([page_num, offset])
+            offset += len(parts[-1])
+        
+        log.info("Total text extracted: %d words", word_count)
+        return {"text": "".join(parts), "page_offsets": page_offsets}
+    elif file_extension == "txt":
+        return {"text": file_bytes.decode("utf-8"), "page_offsets": [[0, 0]]}
+    elif file_extension == "docx":
+        import docx
+
+        doc = docx.Document(io.BytesIO(file_bytes))
+        return {"text": " ".join([paragraph.text for paragraph in doc.paragraphs]), "page_offsets": [[0, 0]]}
+    return {"text": "", "page_offsets": []}
+
+# Function to extract a file, reusing earlier extractions of the same bytes
+def extract_file(file_bytes, file_name, page_range="", word_budget=None):
+    file_extension = file_name.split(".")[-1].lower()
+    if word_budget is None:
+        word_budget = get_setting("PDF_WORD_BUDGET", 20000)
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    cache_key = f"{digest}:{file_extension}:{page_range.replace(' ', '')}:{word_budget}:{get_setting('STRIP_BOILERPLATE', 1)}"
+
+    text_cache = get_text_cache()
+    document = text_cache.get(cache_key)
+    if document is not None:
+        log.debug("Using cached extracted text")
+        return document
+
+    document = extract_document(file_bytes, file_extension, page_range, word_budget)
+    text_cache.set(cache_key, document, persist=bool(document["text"]))
+    return document
@@ -0,0 +1,274 @@
+import io
+import csv
+import json
+import time
+import html
+import sqlite3
+import zipfile
+import hashlib
+import tempfile
+import importlib.util
+
+# Cards serialized per chunk by the streaming writers
+CHUNK_ROWS = 1000
+
+# Function to serialize cards in batches, yielding one chunk of text per batch
+def iter_serialized(qa_pairs, serialize_batch, head="", tail="", separator="", batch_size=CHUNK_ROWS):
+    if head:
+        yield head
+    batch = []
+    first = True
+    for qa in qa_pairs:
+        batch.append(qa)
+        if len(batch) >= batch_size:
+            yield ("" if first else separator) + serialize_batch(batch)
+            first = False
+            batch = []
+    if batch:
+        yield ("" if first else separator) + serialize_batch(batch)
+    if tail:
+        yield tail
+
+# Function to encode rows as delimited text
+def delimited_text(rows, delimiter):
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=delimiter)
+    writer.writerows(rows)
+    return output.getvalue()
+
+# Function to stream cards as delimited text with a header row
+def iter_delimited(qa_pairs, header, delimiter=","):
+    return iter_serialized(
+        qa_pairs,
+        lambda batch: delimited_text(([qa["question"], qa["answer"]] for qa in batch), delimiter),
+        head=delimited_text([header], delimiter)
+    )
+
+# Function to encode a card as compact JSON
+def card_json(qa):
+    return json.dumps(qa, ensure_ascii=False, separators=(",", ":"))
+
+def iter_csv(qa_pairs):
+    return iter_delimited(qa_pairs, ["Question", "Answer"])
+
+def iter_anki(qa_pairs):
+    return iter_delimited(qa_pairs, ["Question", "Answer"], delimiter="\t")
+
+def iter_quizlet(qa_pairs):
+    return iter_delimited(qa_pairs, ["Term", "Definition"])
+
+def iter_json(qa_pairs):
+    return iter_serialized(qa_pairs, lambda batch: ",".join(map(card_json, batch)), head="[", tail="]", separator=",")
+
+def iter_jsonl(qa_pairs):
+    return iter_serialized(qa_pairs, lambda batch: "".join(card_json(qa) + "\n" for qa in batch))
+
+# Anki collection schema (version 11), as read by Anki's .apkg importer
+ANKI_SCHEMA = """
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null, lapses integer not null, left integer not null,
+    odue integer not null, odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null, type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+# Fixed note type id so repeated imports reuse the same note type
+ANKI_MODEL_ID = 1718300000001
+
+ANKI_CSS = ".card { font-family: arial; font-size: 20px; text-align: center; color: black; background-color: white; }"
+
+# Function to build the col row JSON (note type, decks and deck options)
+def anki_collection_config(deck_id, deck_name, now):
+    field = {"font": "Arial", "media": [], "rtl": False, "size": 20, "sticky": False}
+    model = {
+        "id": ANKI_MODEL_ID, "name": "FlashForge Basic", "type": 0, "mod": now, "usn": -1, "sortf": 0,
+        "did": deck_id, "tags": [], "vers": [], "req": [[0, "all", [0]]],
+        "flds": [dict(field, name="Question", ord=0), dict(field, name="Answer", ord=1)],
+        "tmpls": [{
+            "name": "Card 1", "ord": 0, "did": None, "bqfmt": "", "bafmt": "",
+            "qfmt": "{{Question}}", "afmt": "{{FrontSide}}<hr id=answer>{{Answer}}"
+        }],
+        "css": ANKI_CSS,
+        "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n\\begin{document}\n",
+        "latexPost": "\\end{document}"
+    }
+    deck = {
+        "desc": "", "dyn": 0, "collapsed": False, "conf": 1, "usn": -1, "mod": now,
+        "extendNew": 10, "extendRev": 50,
+        "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0]
+    }
+    decks = {
+        "1": dict(deck, id=1, name="Default"),
+        str(deck_id): dict(deck, id=deck_id, name=deck_name)
+    }
+    dconf = {"1": {
+        "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+        "replayq": True, "dyn": False,
+        "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "order": 1, "perDay": 20, "bury": True, "separate": True},
+        "rev": {"perDay": 100, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500, "minSpace": 1, "bury": True},
+        "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0}
+    }}
+    conf = {"activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200, "timeLim": 0,
+            "estTimes": True, "dueCounts": True, "curModel": None, "nextPos": 1, "sortType": "noteFld", "sortBackwards": False}
+    return json.dumps(conf), json.dumps({str(ANKI_MODEL_ID): model}), json.dumps(decks), json.dumps(dconf)
+
+# Function to turn card text into an Anki field
+def anki_field(text):
+    return html.escape(text).replace("\n", "<br>")
+
+# Function to write cards as an Anki package (.apkg): a zip holding a SQLite collection
+def write_apkg(qa_pairs, f, title="FlashForge AI"):
+    now = int(time.time())
+    base_id = int(time.time() * 1000)
+    deck_id = int(hashlib.sha256(title.encode("utf-8")).hexdigest()[:12], 16) + 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection_path = f"{tmp_dir}/collection.anki2"
+        conn = sqlite3.connect(collection_path)
+        try:
+            conn.executescript(ANKI_SCHEMA)
+            conn.execute(
+                "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+                (now, now * 1000, now * 1000) + anki_collection_config(deck_id, title, now)
+            )
+            # Notes and cards are inserted in batches so large decks are never held as rows in memory
+            batch = []
+            for i, qa in enumerate(qa_pairs):
+                question = anki_field(qa["question"])
+                fields = question + "\x1f" + anki_field(qa["answer"])
+                # The guid is derived from the content so re-imports update instead of duplicating
+                guid = hashlib.sha256(fields.encode("utf-8")).hexdigest()[:16]
+                checksum = int(hashlib.sha1(qa["question"].encode("utf-8")).hexdigest()[:8], 16)
+                batch.append((base_id + i, guid, fields, question, checksum, i + 1))
+                if len(batch) >= CHUNK_ROWS:
+                    insert_anki_batch(conn, batch, deck_id, now)
+                    batch = []
+            if batch:
+                insert_anki_batch(conn, batch, deck_id, now)
+            conn.commit()
+        finally:
+            conn.close()
+        with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as package:
+            package.write(collection_path, "collection.anki2")
+            package.writestr("media", "{}")
+
+def insert_anki_batch(conn, batch, deck_id, now):
+    conn.executemany(
+        "INSERT INTO notes VALUES (?, ?, ?, ?, -1, '', ?, ?, ?, 0, '')",
+        [(note_id, guid, ANKI_MODEL_ID, now, fields, sort_field, checksum) for note_id, guid, fields, sort_field, checksum, _ in batch]
+    )
+    conn.executemany(
+        "INSERT INTO cards VALUES (?, ?, ?, 0, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+        [(note_id, note_id, deck_id, now, due) for note_id, _, _, _, _, due in batch]
+    )
+
+# Function to check whether the optional Parquet dependency is installed
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+# Function to write cards as Parquet in row groups (requires pyarrow)
+def write_parquet(qa_pairs, f, title=None, batch_size=65536):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([("question", pa.string()), ("answer", pa.string()), ("source_chunk", pa.int32())])
+    with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+        batch = []
+        for qa in qa_pairs:
+            batch.append(qa)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+# Export format -> streaming text serializer ("chunks") or binary writer ("write"), file suffix and MIME type
+EXPORT_FORMATS = {
+    "csv": {"chunks": iter_csv, "suffix": ".csv", "mime": "text/csv"},
+    "json": {"chunks": iter_json, "suffix": ".json", "mime": "application/json"},
+    "jsonl": {"chunks": iter_jsonl, "suffix": ".jsonl", "mime": "application/x-ndjson"},
+    "anki": {"chunks": iter_anki, "suffix": ".anki.txt", "mime": "text/plain"},
+    "quizlet": {"chunks": iter_quizlet, "suffix": ".quizlet.csv", "mime": "text/csv"},
+    "apkg": {"write": write_apkg, "suffix": ".apkg", "mime": "application/octet-stream"},
+    "parquet": {"write": write_parquet, "suffix": ".parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+# Function to stream an export into a binary file object
+def write_export(qa_pairs, fmt, f, title="FlashForge AI"):
+    export_format = EXPORT_FORMATS[fmt]
+    if "chunks" in export_format:
+        for chunk in export_format["chunks"](qa_pairs):
+            f.write(chunk.encode("utf-8"))
+    else:
+        export_format["write"](qa_pairs, f, title)
+
+# Function to export to bytes, e.g. for a download button
+def export_bytes(qa_pairs, fmt, title="FlashForge AI"):
+    output = io.BytesIO()
+    write_export(qa_pairs, fmt, output, title)
+    return output.getvalue()
+
+# Function to write several formats into one zip archive
+def write_bundle(qa_pairs, formats, f, title="FlashForge AI"):
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for fmt in formats:
+            with bundle.open("flashcards" + EXPORT_FORMATS[fmt]["suffix"], "w") as member:
+                write_export(qa_pairs, fmt, member, title)
+
+# Function to export several formats as zip bytes
+def export_bundle(qa_pairs, formats, title="FlashForge AI"):
+    output = io.BytesIO()
+    write_bundle(qa_pairs, formats, output, title)
+    return output.getvalue()
+
+# Function to hash the deck content, identifying one version of the deck for cached exports
+def deck_hash(qa_pairs):
+    digest = hashlib.sha256()
+    for chunk in iter_jsonl(qa_pairs):
+        digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+# Function to export as CSV
+def export_csv(qa_pairs):
+    return "".join(iter_csv(qa_pairs))
+
+# Function to export as JSON
+def export_json(qa_pairs):
+    return "".join(iter_json(qa_pairs))
+
+# Function to export as JSON Lines
+def export_jsonl(qa_pairs):
+    return "".join(iter_jsonl(qa_pairs))
+
+# Function to export as Anki format
+def export_anki(qa_pairs):
+    return "".join(iter_anki(qa_pairs))
+
+# Function to export as Quizlet format
+def export_quizlet(qa_pairs):
+    return "".join(iter_quizlet(qa_pairs))
+
+# Function to export as an Anki package
+def export_apkg(qa_pairs, title="FlashForge AI"):
+    return export_bytes(qa_pairs, "apkg", title)
+
+# Function to export as Parquet
+def export_parquet(qa_pairs):
+    return export_bytes(qa_pairs, "parquet")
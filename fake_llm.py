@@ -0,0 +1,61 @@
+import os
+import re
+import json
+import random
+import hashlib
+
+# Deterministic stand-in for a language model: answers depend only on the prompt, so runs are repeatable.
+# Used by the fake backend and by the mock Together AI server in benchmarks/.
+
+# Canned cards used as model output
+CANNED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flashcards (1).json")
+
+NUM_QUESTIONS = re.compile(r"create exactly (\d+)")
+TEXT_TO_ANALYZE = re.compile(r"Text to analyze:\s*(.*?)(?:\n\nNow create|\[/INST\])", re.DOTALL)
+TRANSLATION_BLOCK = re.compile(r"^\[(\d+)\]\nQ: (.*?)\nA: (.*?)(?=\n\n\[\d+\]\n|\n\nTranslate all)", re.MULTILINE | re.DOTALL)
+JSON_CARDS = re.compile(r"Flashcards to translate:\n(.*?)\n\nTranslate all", re.DOTALL)
+SENTENCES = re.compile(r"[^.!?]{40,}[.!?]")
+
+# Function to load the canned cards
+def load_canned_cards(path=CANNED_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [{"question": qa["question"], "answer": qa["answer"]} for qa in json.load(f)]
+
+# Function to build n cards for a generation prompt: canned cards first, then cards from the prompt's text
+def generation_cards(prompt, canned, rng):
+    match = NUM_QUESTIONS.search(prompt)
+    count = int(match.group(1)) if match else 10
+    cards = rng.sample(canned, min(count, len(canned)))
+    text = TEXT_TO_ANALYZE.search(prompt)
+    sentences = SENTENCES.findall(text.group(1)) if text else []
+    rng.shuffle(sentences)
+    for sentence in sentences[:count - len(cards)]:
+        sentence = " ".join(sentence.split())
+        words = sentence.split()
+        cards.append({"question": f"What does the text state about {' '.join(words[:6])}?", "answer": sentence})
+    return cards
+
+# Function to answer a translation prompt (text or JSON) with marked-up "translations"
+def translation_text(prompt, json_mode):
+    if json_mode:
+        match = JSON_CARDS.search(prompt)
+        cards = json.loads(match.group(1))["cards"] if match else []
+        return json.dumps({"cards": [
+            {"id": card["id"], "question": f"[tr] {card['question']}", "answer": f"[tr] {card['answer']}"} for card in cards
+        ]}, ensure_ascii=False)
+    return "\n\n".join(
+        f"[{n}]\nQ: [tr] {question}\nA: [tr] {answer}" for n, question, answer in TRANSLATION_BLOCK.findall(prompt)
+    )
+
+# Function to produce the completion text for a request body
+def completion_text(body, canned):
+    prompt = body.get("prompt", "")
+    json_mode = bool(body.get("response_format"))
+    if "translates educational flashcards" in prompt:
+        return translation_text(prompt, json_mode)
+    # Responses depend only on the prompt, so runs are repeatable
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    cards = generation_cards(prompt, canned, rng)
+    if json_mode:
+        return json.dumps({"cards": cards}, ensure_ascii=False)
+    return "\n".join(f"Q: {qa['question']}\nA: {qa['answer']}" for qa in cards)
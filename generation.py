@@ -0,0 +1,288 @@
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from settings import get_setting
+from backends import complete, route, stream_complete
+from chunking import allocate_questions, chunk_coverage, chunk_text, completion_tokens_for, count_tokens
+from qa_parser import QA_JSON_SCHEMA, QAStreamParser, parse_qa_response
+from prompts import qa_prompt
+from metrics import get_logger, metrics, timed
+from scheduler import SchedulerBusy, submit_in_context
+from singleflight import SingleFlight
+
+log = get_logger("generation")
+
+# Identical generations in flight at the same time (e.g. a class uploading the same chapter) share one run
+generation_flight = SingleFlight("generation")
+
+# Raised when the input cannot be turned into flashcards
+class InputError(ValueError):
+    pass
+
+# Function to normalize a question for duplicate detection
+def question_key(question):
+    return " ".join("".join(c for c in question.lower() if c.isalnum() or c.isspace()).split())
+
+# Function to merge Q&A pairs, dropping repeated and near-duplicate cards
+def merge_qa_pairs(*groups):
+    seen = set()
+    merged = []
+    for group in groups:
+        for qa in group:
+            key = question_key(qa["question"])
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(qa)
+    if len(merged) >= 2:
+        # Paraphrased duplicates are caught by MinHash similarity; earlier cards win
+        from dedup import deduplicate_cards
+        merged = deduplicate_cards(merged, threshold=get_setting("DEDUP_THRESHOLD", 0.6))
+    metrics.inc("flashforge_cards_total", sum(map(len, groups)) - len(merged), stage="duplicate")
+    return merged
+
+# Function to record which source chunk each card came from
+def tag_source_chunk(qa_pairs, chunk_index):
+    return [dict(qa, source_chunk=chunk_index) for qa in qa_pairs]
+
+# Function to split a long text into chunks and decide how many cards each chunk gets
+def plan_chunks(text, num_questions):
+    from retrieval import get_chunk_index, retrieval_enabled
+
+    if retrieval_enabled():
+        # Only the most salient, least repetitive chunks are sent
+        index = get_chunk_index(text)
+        return index.chunks, index.plan(num_questions, get_setting("RETRIEVAL_CARDS_PER_CHUNK", 5))
+    chunks = chunk_text(text)
+    return chunks, allocate_questions(chunks, num_questions)
+
+# Function to generate Q&A pairs for all chunks in parallel (map-reduce)
+def generate_qa_map_reduce(text, num_questions, difficulty, subject, on_card=None):
+    chunks, counts = plan_chunks(text, num_questions)
+    jobs = [(i, chunk, count) for i, (chunk, count) in enumerate(zip(chunks, counts)) if count > 0]
+    log.info("Map-reduce over %d chunks, %d with questions: %s", len(chunks), len(jobs), counts)
+
+    results = [[] for _ in chunks]
+    max_workers = max(1, min(len(jobs), get_setting("TOGETHER_MAX_CONCURRENCY", 4)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            submit_in_context(executor, generate_qa_for_chunk, chunk, count, difficulty, subject): i
+            for i, chunk, count in jobs
+        }
+        seen = set()
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = tag_source_chunk(future.result(), futures[future])
+            except SchedulerBusy:
+                # The deck would come back short without saying why; fail the whole generation instead
+                for pending in futures:
+                    pending.cancel()
+                raise
+            except Exception as e:
+                log.error("Error generating Q&A for chunk %d: %s", futures[future], e)
+                continue
+            # Deliver each chunk's cards as soon as it finishes
+            if on_card:
+                for qa in results[futures[future]]:
+                    key = question_key(qa["question"])
+                    if key and key not in seen:
+                        seen.add(key)
+                        on_card(qa)
+
+    # Reduce in document order so merged cards follow the text
+    return merge_qa_pairs(*results)
+
+# Function to get the requested output format: "text" (Q:/A: lines) or "json"
+def get_output_format():
+    output_format = get_setting("QA_OUTPUT_FORMAT", "text").lower()
+    return output_format if output_format in ("text", "json") else "text"
+
+# Function to get the response_format sent to the model for an output format
+def get_response_format(output_format):
+    if output_format == "json":
+        return {"type": "json_object", "schema": QA_JSON_SCHEMA}
+    return None
+
+# Function to build the Q&A generation prompt for a chunk
+@timed("prompt_build")
+def build_qa_prompt(chunk, num_questions, difficulty, subject, avoid_questions=None, output_format="text"):
+    return qa_prompt(chunk, num_questions, difficulty, subject, avoid_questions, output_format)
+
+# Function to stream Q&A pairs for a single chunk as each one completes
+def stream_qa_for_chunk(chunk, num_questions, difficulty, subject):
+    output_format = get_output_format()
+    prompt = build_qa_prompt(chunk, num_questions, difficulty, subject, output_format=output_format)
+    parser = QAStreamParser(output_format)
+    max_tokens = completion_tokens_for(num_questions)
+    for text in stream_complete(prompt, max_tokens, get_response_format(output_format), task="generation"):
+        for qa in parser.feed(text):
+            metrics.inc("flashforge_cards_total", stage="parsed")
+            yield qa
+    for qa in parser.close():
+        metrics.inc("flashforge_cards_total", stage="parsed")
+        yield qa
+
+# Function to generate Q&A pairs for a single chunk
+def generate_qa_for_chunk(chunk, num_questions, difficulty, subject, avoid_questions=None):
+    try:
+        output_format = get_output_format()
+        prompt = build_qa_prompt(chunk, num_questions, difficulty, subject, avoid_questions, output_format)
+        
+        log.debug("Generating Q&A for chunk with prompt: %s", prompt)
+        
+        # Generate response on the backend routed for generation
+        max_tokens = completion_tokens_for(num_questions)
+        generated_text = complete(prompt, max_tokens, get_response_format(output_format), task="generation")
+        if not generated_text:
+            log.warning("No response from the model")
+            return []
+            
+        log.debug("Generated text: %s", generated_text)
+        
+        # JSON responses are validated (and repaired if truncated); Q:/A: text is the fallback
+        qa_pairs = parse_qa_response(generated_text, output_format)
+        metrics.inc("flashforge_cards_total", len(qa_pairs), stage="parsed")
+        
+        log.info("Total Q&A pairs found: %d", len(qa_pairs))
+        return qa_pairs
+    except SchedulerBusy:
+        raise
+    except Exception as e:
+        log.error("Error generating Q&A for chunk: %s", e)
+        return []
+
+# Function to top up a deck with only the missing cards, from the least covered text
+def top_up_qa_pairs(text, qa_pairs, num_questions, difficulty, subject, on_card=None):
+    max_attempts = get_setting("TOPUP_MAX_ATTEMPTS", 3)
+    token_budget = get_setting("TOPUP_TOKEN_BUDGET", 8000)
+    # Long texts are topped up per generation chunk; short ones in smaller slices of chunk 0
+    from retrieval import get_chunk_index, retrieval_enabled
+
+    index = None
+    long_text = count_tokens(text) > get_setting("CHUNK_TOKENS", 2000)
+    if long_text and retrieval_enabled():
+        # Already built (and cached) by plan_chunks
+        index = get_chunk_index(text)
+        chunks = index.chunks
+        sources = list(range(len(chunks)))
+    elif long_text:
+        chunks = chunk_text(text)
+        sources = list(range(len(chunks)))
+    else:
+        chunks = chunk_text(text, get_setting("TOPUP_CHUNK_TOKENS", 800), 0)
+        sources = [0] * len(chunks)
+    tried = set()
+    spent = 0
+    
+    for attempt in range(max_attempts):
+        shortfall = num_questions - len(qa_pairs)
+        if shortfall <= 0:
+            break
+        
+        # Target the part of the text the deck covers least (and, with an index, the most salient)
+        if index is not None:
+            scores = -index.priorities(qa_pairs)
+        else:
+            scores = chunk_coverage(chunks, qa_pairs)
+        candidates = [i for i in sorted(range(len(chunks)), key=scores.__getitem__) if i not in tried]
+        if not candidates:
+            break
+        target = candidates[0]
+        tried.add(target)
+        
+        avoid_questions = [qa["question"] for qa in qa_pairs]
+        prompt = build_qa_prompt(chunks[target], shortfall, difficulty, subject, avoid_questions, get_output_format())
+        cost = count_tokens(prompt) + completion_tokens_for(shortfall)
+        if spent + cost > token_budget:
+            log.info("Top-up token budget reached (%d of %d tokens)", spent, token_budget)
+            break
+        spent += cost
+        
+        log.info("Top-up attempt %d: %d missing cards from chunk %d/%d", attempt + 1, shortfall, target + 1, len(chunks))
+        additional_pairs = generate_qa_for_chunk(chunks[target], shortfall, difficulty, subject, avoid_questions)
+        additional_pairs = tag_source_chunk(additional_pairs, sources[target])
+        known = {question_key(qa["question"]) for qa in qa_pairs}
+        qa_pairs = merge_qa_pairs(qa_pairs, additional_pairs)
+        if on_card:
+            for qa in qa_pairs:
+                if question_key(qa["question"]) not in known:
+                    on_card(qa)
+    
+    return qa_pairs
+
+# Function to generate Q&A pairs using parallel processing
+# on_card is called with each card as it completes
+@timed("generate")
+def generate_qa_pairs(text, num_questions, difficulty, subject, on_card=None):
+    if not text.strip():
+        raise InputError("Please provide some text or upload a file.")
+    
+    log.info("Input text length: %d words", len(text.split()))
+    
+    # Ensure text is not too short
+    if len(text.split()) < 50:
+        raise InputError("The text is too short. Please provide more content.")
+    
+    # Turn new work away early when the request queue is already full
+    route("generation").scheduler.admit()
+    
+    key = generation_key(text, num_questions, difficulty, subject)
+    qa_pairs, leader = generation_flight.do(key, lambda: generate_deck(text, num_questions, difficulty, subject, on_card))
+    if not leader:
+        log.info("Shared %d Q&A pairs from an identical generation already in progress", len(qa_pairs))
+        if on_card:
+            for qa in qa_pairs:
+                on_card(qa)
+    metrics.inc("flashforge_cards_total", len(qa_pairs), stage="returned")
+    # Every caller gets its own copy, since sessions edit their decks in place
+    return [dict(qa) for qa in qa_pairs]
+
+# Function to build the key that identifies identical generation requests
+def generation_key(text, num_questions, difficulty, subject):
+    params = {
+        "text": hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest(),
+        "num_questions": num_questions,
+        "difficulty": difficulty,
+        "subject": subject,
+        "output_format": get_output_format()
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Function to generate a deck for a text
+def generate_deck(text, num_questions, difficulty, subject, on_card=None):
+    # Optionally keep only the key sentences, so every prompt below is shorter
+    if get_setting("SUMMARY_RATIO", 1.0) < 1.0:
+        from summarize import summarize_text
+        text = summarize_text(text)
+    
+    # Long texts are split into chunks and generated in parallel
+    max_text_tokens = get_setting("CHUNK_TOKENS", 2000)  # Maximum text tokens for a single prompt
+    text_tokens = count_tokens(text)
+    if text_tokens > max_text_tokens:
+        log.info("Text too long (%d tokens), using map-reduce generation...", text_tokens)
+        qa_pairs = generate_qa_map_reduce(text, num_questions, difficulty, subject, on_card)
+    elif on_card:
+        # Stream a single query, delivering each card once it is complete
+        log.info("Streaming %d questions...", num_questions)
+        qa_pairs = []
+        for qa in stream_qa_for_chunk(text, num_questions, difficulty, subject):
+            qa_pairs.append(qa)
+            on_card(qa)
+    else:
+        # Generate Q&A pairs in a single query
+        log.info("Generating %d questions...", num_questions)
+        qa_pairs = generate_qa_for_chunk(text, num_questions, difficulty, subject)
+    
+    if text_tokens <= max_text_tokens:
+        qa_pairs = merge_qa_pairs(tag_source_chunk(qa_pairs, 0))
+    log.info("Total Q&A pairs generated: %d", len(qa_pairs))
+    
+    # If we don't have enough pairs, request only the missing ones
+    if len(qa_pairs) < num_questions:
+        log.info("Not enough pairs generated, topping up...")
+        qa_pairs = top_up_qa_pairs(text, qa_pairs, num_questions, difficulty, subject, on_card)
+    
+    # Limit to requested number of questions
+    final_pairs = qa_pairs[:num_questions]
+    log.debug("Final Q&A pairs: %s", final_pairs)
+    return final_pairs
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import get_setting
+from metrics import get_logger, metrics
+from scheduler import SchedulerBusy, submit_in_context
+from generation import InputError, generate_qa_pairs
+from translation import translate_qa_pairs
+
+log = get_logger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# This process, as recorded on the jobs it runs
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# A generation or translation running in the background; the UI polls its snapshot
+class Job:
+    def __init__(self, job_id, kind, params, total):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.total = total
+        self.status = QUEUED
+        self.partial = []
+        self.done_count = 0
+        self.result = None
+        self.error = None
+        # Problems with the input or load (shown as warnings) rather than failures of the app
+        self.expected_error = False
+        self.updated_at = time.time()
+        # Called after every change, e.g. to record the job in the store
+        self.on_update = None
+        self.lock = threading.Lock()
+
+    def update(self, **fields):
+        with self.lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated_at = time.time()
+        if self.on_update:
+            self.on_update(self)
+
+    def add_card(self, qa):
+        with self.lock:
+            partial = self.partial + [qa]
+        self.update(partial=partial, done_count=len(partial))
+
+    def set_done_count(self, count):
+        self.update(done_count=count)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": min(1.0, self.done_count / self.total) if self.total else 0.0,
+                "partial": list(self.partial),
+                "result": self.result,
+                "error": self.error,
+                "expected_error": self.expected_error,
+            }
+
+# Function to generate a deck as a job; cards are published as they complete
+def run_generate(job, text, num_questions, difficulty, subject):
+    return generate_qa_pairs(text, num_questions, difficulty, subject, on_card=job.add_card)
+
+# Function to translate cards as a job, reporting progress after each batch
+def run_translate(job, qa_pairs, target_language):
+    return translate_qa_pairs(qa_pairs, target_language, on_progress=job.set_done_count)
+
+# Job kind -> (runner, function giving the number of items for progress)
+JOB_KINDS = {
+    "generate": (run_generate, lambda params: params["num_questions"]),
+    "translate": (run_translate, lambda params: len(params["qa_pairs"])),
+}
+
+# Optional SQLite record of jobs, so results outlive reruns, restarts and worker processes
+class JobStore:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+            "snapshot TEXT NOT NULL, owner TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated_at)")
+        self.conn.commit()
+
+    def save(self, job):
+        snapshot = job.snapshot()
+        with self.lock:
+            # The parameters (e.g. the whole document) are only written once
+            self.conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, snapshot, owner, updated_at) VALUES (?, ?, '', ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, snapshot = excluded.snapshot, "
+                "owner = excluded.owner, updated_at = excluded.updated_at",
+                (job.id, job.kind, snapshot["status"], json.dumps(snapshot), OWNER, job.updated_at)
+            )
+            if snapshot["status"] == QUEUED:
+                self.conn.execute("UPDATE jobs SET params = ? WHERE id = ?", (json.dumps(job.params), job.id))
+            self.conn.commit()
+
+    def load(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT snapshot FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Function to find unfinished jobs whose process has exited
+    def orphaned(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, kind, params, owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+        return [(job_id, kind, json.loads(params)) for job_id, kind, params, owner in rows if not owner_alive(owner)]
+
+    def prune(self, max_age):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, time.time() - max_age)
+            )
+            self.conn.commit()
+
+# Function to check whether the process that owns a job is still running
+def owner_alive(owner):
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        # Jobs of other machines are never taken over
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+# Process-local worker pool; jobs are tracked by id and finished jobs are kept for max_age seconds
+class JobQueue:
+    def __init__(self, max_workers=4, store=None, max_age=3600.0):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.store = store
+        self.max_age = max_age
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    # Function to queue a job; params must be JSON-serializable so the store can rerun it
+    def submit(self, kind, job_id=None, **params):
+        runner, total = JOB_KINDS[kind]
+        job = Job(job_id or uuid.uuid4().hex, kind, params, total(params))
+        job.on_update = self.save
+        self.prune()
+        with self.lock:
+            self.jobs[job.id] = job
+        self.save(job)
+        submit_in_context(self.executor, self.run, job, runner)
+        log.info("Queued %s job %s", kind, job.id)
+        return job.id
+
+    def run(self, job, runner):
+        job.update(status=RUNNING)
+        try:
+            job.update(result=runner(job, **job.params), status=DONE)
+        except (InputError, SchedulerBusy) as e:
+            job.update(error=str(e), expected_error=True, status=FAILED)
+        except Exception as e:
+            log.error("Error in %s job %s: %s", job.kind, job.id, e)
+            job.update(error=str(e), status=FAILED)
+        metrics.inc("flashforge_jobs_total", kind=job.kind, status=job.status)
+
+    def save(self, job):
+        if self.store is not None:
+            try:
+                self.store.save(job)
+            except sqlite3.Error as e:
+                log.warning("Could not record job %s: %s", job.id, e)
+
+    # Function to get a job's status, progress and (partial) result, or None for unknown ids
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        # Jobs run by another worker process, or before a restart
+        return self.store.load(job_id) if self.store is not None else None
+
+    def prune(self):
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            for job_id, job in list(self.jobs.items()):
+                if job.status in (DONE, FAILED) and job.updated_at < cutoff:
+                    del self.jobs[job_id]
+        if self.store is not None:
+            self.store.prune(self.max_age)
+
+    # Function to rerun jobs left unfinished by a process that has exited
+    def recover(self):
+        for job_id, kind, params in self.store.orphaned() if self.store is not None else []:
+            log.info("Resuming %s job %s", kind, job_id)
+            self.submit(kind, job_id=job_id, **params)
+
+@functools.cache
+def get_job_queue():
+    path = get_setting("JOB_STORE_PATH", "")
+    queue = JobQueue(
+        max_workers=get_setting("JOB_WORKERS", 4),
+        store=JobStore(path) if path else None,
+        max_age=get_setting("JOB_TTL_HOURS", 1.0) * 3600
+    )
+    queue.recover()
+    return queue
+
+# Function to start a background job; returns its id
+def submit_job(kind, **params):
+    return get_job_queue().submit(kind, **params)
+
+# Function to poll a job; returns its snapshot or None
+def get_job(job_id):
+    return get_job_queue().get(job_id)
@@ -0,0 +1,162 @@
+import time
+import logging
+import threading
+import functools
+import contextlib
+
+from settings import get_setting
+
+# Histogram buckets (seconds) for stage timings
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Metric name -> (type, help text), in the order they are exposed
+METRICS = {
+    "flashforge_stage_seconds": ("histogram", "Time spent in each pipeline stage"),
+    "flashforge_cache_requests_total": ("counter", "Cache lookups by cache and result (hit or miss)"),
+    "flashforge_http_requests_total": ("counter", "Together AI requests by status code"),
+    "flashforge_tokens_total": ("counter", "Prompt and completion tokens reported by Together AI"),
+    "flashforge_cards_total": ("counter", "Flashcards parsed, dropped as duplicates and returned"),
+    "flashforge_scheduler_rejected_total": ("counter", "Requests turned away because the scheduler queue was full"),
+    "flashforge_jobs_total": ("counter", "Background jobs finished, by kind and status"),
+    "flashforge_coalesced_total": ("counter", "Calls that waited on an identical in-flight call instead of running their own"),
+}
+
+# Function to get a logger whose level is set by the LOG_LEVEL setting
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f"flashforge.{name}")
+
+@functools.cache
+def configure_logging():
+    logger = logging.getLogger("flashforge")
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(get_setting("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+# Process-wide counters and histograms
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            # Per-bucket counts, then sum and count
+            histogram = self.histograms.setdefault(key, [0] * len(BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    # Function to compute hit rates from the cache counters
+    def cache_hit_rates(self):
+        lookups = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                if name == "flashforge_cache_requests_total":
+                    labels = dict(labels)
+                    hits, total = lookups.get(labels["cache"], (0, 0))
+                    lookups[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+        return {cache: hits / total for cache, (hits, total) in lookups.items() if total}
+
+    # Function to render all metrics in the Prometheus text exposition format
+    def render(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: list(value) for key, value in self.histograms.items()}
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram[-1]}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram[-2]}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+# Function to key a set of labels; values are strings, as exposed, so e.g. status 200 and "connection_error" sort together
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+metrics = Metrics()
+
+# Time a block as one pipeline stage
+@contextlib.contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe("flashforge_stage_seconds", time.perf_counter() - start, stage=stage)
+
+# Decorator to time every call of a function as one pipeline stage
+def timed(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function to serve /metrics in Prometheus text format on a local port (once per process)
+@functools.cache
+def start_metrics_server(port=None):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    port = get_setting("METRICS_PORT", 0) if port is None else port
+    if not port:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((get_setting("METRICS_HOST", "127.0.0.1"), port), MetricsHandler)
+    except OSError as e:
+        # Another process (e.g. a second Streamlit worker) may already serve the port
+        get_logger("metrics").warning("Metrics endpoint not started on port %s: %s", port, e)
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    get_logger("metrics").info("Serving metrics on http://%s:%s/metrics", *server.server_address[:2])
+    return server
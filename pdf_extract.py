@@ -0,0 +1,67 @@
+import io
+import os
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+# Below this many pages the process pool start-up costs more than it saves
+PARALLEL_MIN_PAGES = 8
+
+# PDF reader opened once in each worker process
+worker_reader = None
+
+def init_worker(pdf_bytes):
+    global worker_reader
+    worker_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+
+def extract_page(page_num):
+    return page_num, worker_reader.pages[page_num].extract_text() or ""
+
+# Function to count the pages of a PDF
+def count_pdf_pages(pdf_bytes):
+    return len(PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+# Function to turn a page range like "1-5, 8, 10-" into 0-based page numbers
+def parse_page_range(page_range, total_pages):
+    pages = []
+    for part in page_range.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start = int(start) if start.strip() else 1
+            end = int(end) if end.strip() else total_pages
+        else:
+            start = end = int(part)
+        if start < 1 or end > total_pages or start > end:
+            raise ValueError(f"Invalid page range '{part}' for a {total_pages}-page document")
+        pages.extend(range(start - 1, end))
+    # Keep document order and drop pages selected twice
+    return sorted(set(pages))
+
+# Generator yielding (page_num, text) in page order, extracting pages in parallel
+def iter_pdf_pages(pdf_bytes, page_numbers, max_workers=None):
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, 4)
+
+    if max_workers <= 1 or len(page_numbers) < PARALLEL_MIN_PAGES:
+        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        for page_num in page_numbers:
+            yield page_num, reader.pages[page_num].extract_text() or ""
+        return
+
+    executor = ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(pdf_bytes,))
+    try:
+        # Keep a bounded window of pages in flight so an early stop wastes little work
+        remaining = iter(page_numbers)
+        pending = deque(executor.submit(extract_page, n) for n in itertools.islice(remaining, max_workers * 2))
+        while pending:
+            yield pending.popleft().result()
+            page_num = next(remaining, None)
+            if page_num is not None:
+                pending.append(executor.submit(extract_page, page_num))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,25 @@
+# Public entry points of the generation pipeline, shared by the UI and the CLI.
+# Submodules import their heavy dependencies (requests, PyPDF2, docx, numpy, pyarrow)
+# only when they are first needed.
+from generation import InputError, generate_qa_pairs
+from documents import extract_file
+from translation import translate_qa_pairs
+from jobs import DONE, FAILED, QUEUED, RUNNING, get_job, submit_job
+from metrics import get_logger, metrics, span, start_metrics_server
+from scheduler import BATCH, INTERACTIVE, SchedulerBusy, request_priority
+from backends import estimate_wait, get_backend, missing_api_keys, route
+from exporters import (
+    EXPORT_FORMATS,
+    deck_hash,
+    export_anki,
+    export_apkg,
+    export_bundle,
+    export_bytes,
+    export_csv,
+    export_json,
+    export_jsonl,
+    export_parquet,
+    export_quizlet,
+    parquet_available,
+    write_export,
+)
@@ -0,0 +1,64 @@
+import functools
+
+# Formatting guidance per subject; a prompt only carries the rules of its own subject
+SUBJECT_RULES = {
+    "Physics": "Include formulas, units, and physical concepts. Use proper scientific notation and SI units.",
+    "Chemistry": "Include chemical formulas, equations, and molecular structures. Use proper chemical notation.",
+    "Mathematics": "Include formulas, equations, and step-by-step solutions. Use proper mathematical notation.",
+    "Biology": "Include scientific terms and concepts",
+    "History": "Include dates, events, and historical context",
+    "Computer Science": "Include technical terms and programming concepts",
+    "Literature": "Include themes, characters, and literary devices",
+    "General": "Focus on key concepts and main ideas",
+}
+
+# Output format -> (instructions, reminder in the task line)
+FORMATS = {
+    "json": ("""IMPORTANT: You must respond with only a JSON object exactly like this:
+{"cards": [{"question": "Your question here", "answer": "Your answer here"}]}
+
+Rules:
+1. Each card must have a "question" and an "answer" string
+2. Do not add any text before or after the JSON object""", "as a JSON object"),
+    "text": ("""IMPORTANT: You must format each question and answer pair exactly like this:
+Q: [Your question here]
+A: [Your answer here]
+
+Rules:
+1. Each question must start with "Q: "
+2. Each answer must start with "A: \"""", "following the format above"),
+}
+
+# Function to get the system prompt for a subject and output format, built once per combination
+# It holds no per-request values, so every prompt of a subject starts with the same prefix and
+# providers that cache prompt prefixes can reuse it across chunks, documents and users
+@functools.cache
+def system_prompt(subject, output_format):
+    instructions, _ = FORMATS[output_format]
+    rules = SUBJECT_RULES.get(subject, SUBJECT_RULES["General"])
+    return f"""<s>[INST] <<SYS>>
+You are a helpful AI assistant that creates educational flashcards for {subject}. Your task is to create questions and answers based on the provided text, in the number and difficulty given with the text.
+
+{instructions}
+3. Create exactly the requested number of pairs
+4. Make questions the requested difficulty
+5. Keep answers concise but informative
+6. Focus on different aspects of the text than the previous questions
+7. Format questions and answers appropriately for {subject}: {rules}
+<</SYS>>
+
+"""
+
+# Function to build a Q&A generation prompt: the cached system prompt, then the request, then the text last
+def qa_prompt(chunk, num_questions, difficulty, subject, avoid_questions=None, output_format="text"):
+    _, reminder = FORMATS[output_format]
+    # Questions already in the deck are listed so the model does not repeat them
+    exclusions = ""
+    if avoid_questions:
+        listed = "\n".join(f"- {question}" for question in avoid_questions)
+        exclusions = f"Questions already created (do not repeat or rephrase them):\n{listed}\n\n"
+    return (
+        system_prompt(subject, output_format)
+        + f"Task: create exactly {num_questions} {difficulty.lower()} difficulty Q&A pairs {reminder}, tailored for {subject}.\n\n"
+        + f"{exclusions}Text to analyze: {chunk} [/INST]</s>"
+    )
@@ -0,0 +1,207 @@
+import re
+import json
+
+from metrics import timed
+
+# A "Q:"/"A:" marker at the start of a line, tolerating numbering and markdown
+# bold, e.g. "Q: ...", "2. Q: ...", "**Question:** ...", "A1: ..."
+QA_MARKER = re.compile(
+    r"^[ \t]*(?:\d+[.)][ \t]*)?\**[ \t]*(Q|A|Question|Answer)[ \t]*\d*[ \t]*\**[ \t]*:[ \t]*\**",
+    re.MULTILINE
+)
+
+# A blank line, which ends the last answer of a response
+BLANK_LINE = re.compile(r"\n[ \t]*\n")
+
+# JSON schema requested from the model in JSON mode
+QA_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cards": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"}
+                },
+                "required": ["question", "answer"]
+            }
+        }
+    },
+    "required": ["cards"]
+}
+
+# Function to parse Q&A pairs from a complete response in a single regex pass
+# final: the text ends the response, so a paragraph after the last pair is the model's closing remark
+def parse_qa_text(generated_text, final=True):
+    pairs = []
+    question = None
+    answer = None
+    markers = list(QA_MARKER.finditer(generated_text))
+    for marker, following in zip(markers, markers[1:] + [None]):
+        # A marker's content runs until the next marker, so answers can span lines
+        content = generated_text[marker.end():following.start() if following else len(generated_text)].strip()
+        if following is None and final:
+            content = BLANK_LINE.split(content, 1)[0]
+        content = content.strip("*").strip()
+        if marker.group(1)[0] == "Q":
+            if question and answer:
+                pairs.append({"question": question, "answer": answer})
+            # Handle cases where the answer follows on the next line without an A: prefix
+            first_line, _, rest = content.partition("\n")
+            question = first_line.strip()
+            answer = rest.strip() or None
+        elif question:
+            answer = content or answer
+    if question and answer:
+        pairs.append({"question": question, "answer": answer})
+    return pairs
+
+# Function to cut truncated JSON back to its last complete array item and close it
+def repair_truncated_json(text):
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return None
+    stack = []
+    in_string = False
+    escaped = False
+    last_safe = None
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return text[start:i + 1]
+            # The end of an array item is a safe place to cut
+            if stack[-1] == "]":
+                last_safe = (i + 1, list(stack))
+    if last_safe is None:
+        return None
+    end, open_brackets = last_safe
+    return text[start:end] + "".join(reversed(open_brackets))
+
+# Function to keep only well-formed cards from parsed JSON
+def validate_qa_items(data):
+    if isinstance(data, dict):
+        data = data.get("cards", data.get("flashcards", []))
+    if not isinstance(data, list):
+        return []
+    pairs = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        question = item.get("question")
+        answer = item.get("answer")
+        if isinstance(question, str) and isinstance(answer, str) and question.strip() and answer.strip():
+            pair = {"question": question.strip(), "answer": answer.strip()}
+            if isinstance(item.get("id"), int):
+                pair["id"] = item["id"]
+            pairs.append(pair)
+    return pairs
+
+# Function to parse Q&A pairs from a (possibly truncated) JSON response
+def parse_qa_json(generated_text):
+    try:
+        return validate_qa_items(json.loads(generated_text))
+    except ValueError:
+        pass
+    repaired = repair_truncated_json(generated_text)
+    if repaired is None:
+        return []
+    try:
+        return validate_qa_items(json.loads(repaired))
+    except ValueError:
+        return []
+
+# Function to parse a response in the given output format, falling back to Q:/A: text
+@timed("parse")
+def parse_qa_response(generated_text, output_format="text"):
+    if output_format == "json":
+        pairs = parse_qa_json(generated_text)
+        if pairs:
+            return pairs
+    return parse_qa_text(generated_text)
+
+# Incremental parser for streamed responses, emitting each pair once it is complete
+class QAStreamParser:
+    def __init__(self, output_format="text"):
+        self.output_format = output_format
+        self.buffer = ""
+        self.emitted = 0
+        # JSON mode: scan position, open brackets as (closing bracket, start offset), string state
+        self.scan = 0
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.finished = False
+
+    # Function to scan only the new part of the buffer and parse the card objects it closes
+    def feed_json(self):
+        items = []
+        buffer = self.buffer
+        for i in range(self.scan, len(buffer)):
+            if self.finished:
+                break
+            c = buffer[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif c == "\\":
+                    self.escaped = True
+                elif c == '"':
+                    self.in_string = False
+            elif c == '"':
+                # Quotes in text before the JSON starts are not strings
+                self.in_string = bool(self.stack)
+            elif c in "{[":
+                self.stack.append(("}" if c == "{" else "]", i))
+            elif c in "}]" and self.stack:
+                closer, start = self.stack.pop()
+                if not self.stack:
+                    self.finished = True
+                elif closer == "}" and self.stack[-1][0] == "]":
+                    # An object that is an array item, i.e. a card
+                    try:
+                        items.append(json.loads(buffer[start:i + 1]))
+                    except ValueError:
+                        pass
+        self.scan = len(buffer)
+        pairs = validate_qa_items(items)
+        self.emitted += len(pairs)
+        return pairs
+
+    def feed(self, text):
+        self.buffer += text
+        if self.output_format == "json":
+            return self.feed_json()
+        # A pair is complete once the next question starts
+        last_question = None
+        for marker in QA_MARKER.finditer(self.buffer):
+            if marker.group(1)[0] == "Q":
+                last_question = marker
+        if last_question is None or last_question.start() == 0:
+            return []
+        complete, self.buffer = self.buffer[:last_question.start()], self.buffer[last_question.start():]
+        return parse_qa_text(complete, final=False)
+
+    def close(self):
+        if self.output_format == "json":
+            pairs = parse_qa_response(self.buffer, "json")[self.emitted:]
+            self.emitted += len(pairs)
+            return pairs
+        rest, self.buffer = self.buffer, ""
+        return parse_qa_text(rest)
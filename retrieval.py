@@ -0,0 +1,126 @@
+import re
+import zlib
+import hashlib
+
+import numpy as np
+
+from settings import get_setting
+from caches import get_text_cache
+from chunking import chunk_text
+from metrics import get_logger, timed
+
+log = get_logger("retrieval")
+
+TERMS = re.compile(r"[^\W\d_]{3,}")
+
+# Frequent words that say nothing about a chunk's topic
+STOPWORDS = frozenset("""
+about after also and are been before being between both but can could did does each either from had has have her
+here him his how into its itself just many may more most much must not now off once only other our out over own
+same she should since some such than that the their them then there these they this those through too under until
+very was were what when where which while who whom why will with would you your
+""".split())
+
+# Terms are hashed into a fixed number of dimensions, so the index needs no vocabulary
+DIMENSIONS = 4096
+
+# BM25 parameters: term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Function to get the hashed term ids and counts of a text
+def term_counts(text):
+    terms = [term for term in TERMS.findall(text.lower()) if term not in STOPWORDS]
+    ids = np.fromiter((zlib.crc32(term.encode("utf-8")) % DIMENSIONS for term in terms), dtype=np.int64, count=len(terms))
+    counts = np.bincount(ids, minlength=DIMENSIONS)
+    present = np.flatnonzero(counts)
+    return present, counts[present]
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+# BM25-weighted hashed term vectors of a document's chunks
+class ChunkIndex:
+    def __init__(self, chunks, terms):
+        self.chunks = chunks
+        self.terms = terms
+        counts = np.zeros((len(chunks), DIMENSIONS), dtype=np.float32)
+        for row, (ids, values) in enumerate(terms):
+            counts[row, ids] = values
+        lengths = counts.sum(axis=1, keepdims=True)
+        frequency = np.count_nonzero(counts, axis=0)
+        self.idf = np.log1p((len(chunks) - frequency + 0.5) / (frequency + 0.5)).astype(np.float32)
+        saturation = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0))
+        self.vectors = normalize_rows(self.idf * counts * (BM25_K1 + 1) / (counts + saturation))
+        # Chunks close to the document's centroid carry its main topics
+        centroid = self.vectors.sum(axis=0)
+        self.salience = np.clip(self.vectors @ (centroid / (np.linalg.norm(centroid) or 1.0)), 0.0, None)
+
+    @classmethod
+    def build(cls, text, chunk_tokens):
+        chunks = chunk_text(text, chunk_tokens, 0)
+        return cls(chunks, [term_counts(chunk) for chunk in chunks])
+
+    # Function to embed texts (e.g. cards) in the same space as the chunks
+    def embed(self, texts):
+        counts = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+        for row, text in enumerate(texts):
+            ids, values = term_counts(text)
+            counts[row, ids] = values
+        return normalize_rows(self.idf * counts / (counts + BM25_K1))
+
+    # Function to score how well the existing cards already cover each chunk (0 to 1)
+    def coverage(self, qa_pairs):
+        if not qa_pairs:
+            return np.zeros(len(self.chunks), dtype=np.float32)
+        cards = self.embed([qa["question"] + " " + qa["answer"] for qa in qa_pairs])
+        return np.clip((self.vectors @ cards.T).max(axis=1), 0.0, 1.0)
+
+    # Function to rank chunks by how salient and how little covered they are
+    def priorities(self, qa_pairs=()):
+        return self.salience * (1.0 - self.coverage(qa_pairs))
+
+    # Function to pick chunks for the requested cards, a few cards per pick; returns the number of cards per chunk
+    # Each prompt carries a fixed instruction overhead, so single-card prompts would waste most of their tokens
+    def plan(self, num_questions, cards_per_chunk=5, qa_pairs=(), decay=0.5):
+        # At least one card per pick, or a misconfigured setting would never finish the plan
+        cards_per_chunk = max(1, int(cards_per_chunk))
+        priority = self.priorities(qa_pairs).astype(np.float64)
+        similarity = self.vectors @ self.vectors.T
+        counts = [0] * len(self.chunks)
+        remaining = num_questions
+        while remaining > 0:
+            best = int(np.argmax(priority))
+            counts[best] += min(cards_per_chunk, remaining)
+            remaining -= cards_per_chunk
+            # The chosen chunk and chunks like it become less attractive for the next pick
+            priority *= 1.0 - decay * np.clip(similarity[best], 0.0, 1.0)
+        return counts
+
+    def to_dict(self):
+        return {"chunks": self.chunks, "terms": [[ids.tolist(), values.tolist()] for ids, values in self.terms]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["chunks"], [(np.array(ids, dtype=np.int64), np.array(values)) for ids, values in data["terms"]])
+
+# Function to check whether retrieval-targeted generation is enabled
+def retrieval_enabled():
+    return get_setting("RETRIEVAL_CHUNK_TOKENS", 800) > 0
+
+# Function to get the chunk index of a text, stored in the document cache next to the extracted text
+@timed("index")
+def get_chunk_index(text, chunk_tokens=None):
+    if chunk_tokens is None:
+        chunk_tokens = get_setting("RETRIEVAL_CHUNK_TOKENS", 800)
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    cache_key = f"index:{digest}:{chunk_tokens}:{DIMENSIONS}"
+    text_cache = get_text_cache()
+    data = text_cache.get(cache_key)
+    if data is not None:
+        return ChunkIndex.from_dict(data)
+    index = ChunkIndex.build(text, chunk_tokens)
+    log.info("Indexed %d chunks of up to %d tokens", len(index.chunks), chunk_tokens)
+    text_cache.set(cache_key, index.to_dict())
+    return index
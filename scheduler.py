@@ -0,0 +1,189 @@
+import time
+import heapq
+import itertools
+import threading
+import functools
+import contextlib
+import contextvars
+
+from settings import get_api_keys, get_setting
+from metrics import get_logger, metrics
+
+log = get_logger("scheduler")
+
+# Request priorities; lower is served first
+INTERACTIVE = 0
+BATCH = 1
+
+# Priority of requests made by the current task (threads started with copy_context inherit it)
+current_priority = contextvars.ContextVar("current_priority", default=INTERACTIVE)
+
+# Raised when the request queue is too long to accept more work
+class SchedulerBusy(RuntimeError):
+    pass
+
+@contextlib.contextmanager
+def request_priority(priority):
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+# Function to submit work to an executor so it keeps the caller's priority
+def submit_in_context(executor, fn, *args, **kwargs):
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+# Token bucket refilled continuously up to its capacity
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def time_until(self, amount, now):
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.refill_per_second
+
+    def take(self, amount, now):
+        # A negative amount refunds tokens that were reserved but not used
+        self.refill(now)
+        self.level = min(self.capacity, self.level - min(amount, self.capacity))
+
+# Rate limits and in-flight requests of one API key
+class KeyState:
+    def __init__(self, key, requests_per_minute, tokens_per_minute, max_concurrency):
+        self.key = key
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+
+    def time_until_ready(self, tokens, now):
+        if self.in_flight >= self.max_concurrency:
+            return None
+        return max(self.cooldown_until - now, self.requests.time_until(1, now), self.tokens.time_until(tokens, now), 0.0)
+
+# A granted request slot; reports the actual token usage and rate limiting back to the scheduler
+class Slot:
+    def __init__(self, scheduler, state, tokens):
+        self.scheduler = scheduler
+        self.state = state
+        self.key = state.key
+        self.tokens = tokens
+
+    def record_usage(self, tokens):
+        self.scheduler.adjust_tokens(self.state, tokens - self.tokens)
+        self.tokens = tokens
+
+    def rate_limited(self, retry_after):
+        self.scheduler.cool_down(self.state, retry_after)
+
+# Process-wide scheduler: picks the key that can serve a request soonest, in priority order
+class RequestScheduler:
+    def __init__(self, keys, requests_per_minute=60, tokens_per_minute=100000, max_concurrency=4, max_queue=64, max_wait=120.0):
+        self.states = [KeyState(key, requests_per_minute, tokens_per_minute, max_concurrency) for key in keys]
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    # Function to reject new work early when the queue is already full
+    def admit(self, priority=None):
+        priority = current_priority.get() if priority is None else priority
+        with self.condition:
+            # Batch work backs off at half the queue so interactive users still get in
+            limit = self.max_queue if priority == INTERACTIVE else self.max_queue // 2
+            if len(self.waiting) >= limit:
+                metrics.inc("flashforge_scheduler_rejected_total", priority=priority)
+                raise SchedulerBusy("Too many requests are queued right now. Please try again in a minute.")
+
+    # Function to estimate how long a new request would wait for a slot
+    def estimate_wait(self, tokens=1000, priority=None):
+        priority = current_priority.get() if priority is None else priority
+        now = time.monotonic()
+        with self.condition:
+            ahead = sum(1 for waiter in self.waiting if waiter[0] <= priority)
+            ready = [t for t in (state.time_until_ready(tokens, now) for state in self.states) if t is not None]
+            soonest = min(ready) if ready else 0.0
+            # Sustained requests per second across all keys
+            rate = sum(min(s.requests.refill_per_second, s.tokens.refill_per_second / max(tokens, 1)) for s in self.states)
+        return max(soonest, ahead / rate if rate else 0.0)
+
+    @contextlib.contextmanager
+    def slot(self, tokens, priority=None):
+        priority = current_priority.get() if priority is None else priority
+        state = self.acquire(tokens, priority)
+        try:
+            yield Slot(self, state, tokens)
+        finally:
+            self.release(state)
+
+    def acquire(self, tokens, priority):
+        if not self.states:
+            raise RuntimeError("No API key configured")
+        entry = (priority, next(self.counter))
+        start = time.monotonic()
+        with self.condition:
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    # Only the head of the queue may take a slot, so priorities are respected
+                    if self.waiting[0] == entry:
+                        best = None
+                        for state in self.states:
+                            ready = state.time_until_ready(tokens, now)
+                            if ready is not None and (wait is None or ready < wait):
+                                best, wait = state, ready
+                        if best is not None and wait == 0.0:
+                            best.requests.take(1, now)
+                            best.tokens.take(tokens, now)
+                            best.in_flight += 1
+                            metrics.observe("flashforge_stage_seconds", now - start, stage="scheduler_wait")
+                            return best
+                    if now - start + (wait or 0.0) > self.max_wait:
+                        raise SchedulerBusy(f"No request slot available within {self.max_wait:.0f}s")
+                    # Woken early when a slot is released or the queue head changes
+                    self.condition.wait(timeout=min(wait, 1.0) if wait else 1.0)
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    def release(self, state):
+        with self.condition:
+            state.in_flight -= 1
+            self.condition.notify_all()
+
+    def adjust_tokens(self, state, difference):
+        with self.condition:
+            state.tokens.take(difference, time.monotonic())
+            self.condition.notify_all()
+
+    def cool_down(self, state, seconds):
+        with self.condition:
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + seconds)
+            log.warning("Rate limited on key ...%s, pausing it for %.1fs", state.key[-4:], seconds)
+
+@functools.cache
+def get_scheduler():
+    keys = get_api_keys()
+    log.info("Scheduling requests across %d API key(s)", len(keys))
+    return RequestScheduler(
+        keys,
+        requests_per_minute=get_setting("TOGETHER_RPM", 60),
+        tokens_per_minute=get_setting("TOGETHER_TPM", 100000),
+        max_concurrency=get_setting("TOGETHER_MAX_CONCURRENCY", 4),
+        max_queue=get_setting("SCHEDULER_MAX_QUEUE", 64),
+        max_wait=get_setting("SCHEDULER_MAX_WAIT", 120.0)
+    )
@@ -0,0 +1,48 @@
+import os
+import logging
+import functools
+import tomllib
+
+# Plain stdlib logger: metrics.get_logger reads LOG_LEVEL through this module, so it cannot be used here
+log = logging.getLogger("flashforge.settings")
+
+# Secrets files read by Streamlit; the project file takes precedence
+SECRETS_PATHS = [
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(os.getcwd(), ".streamlit", "secrets.toml")
+]
+
+@functools.cache
+def load_secrets():
+    secrets = {}
+    for path in SECRETS_PATHS:
+        try:
+            with open(path, "rb") as f:
+                secrets.update(tomllib.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.warning("Error reading %s: %s", path, e)
+    return secrets
+
+# Function to read an optional setting from secrets or the environment
+def get_setting(name, default):
+    secrets = load_secrets()
+    if name in secrets:
+        return type(default)(secrets[name])
+    return type(default)(os.environ.get(name, default))
+
+# Function to get the Together AI API key
+def get_api_key():
+    return get_setting("TOGETHER_API_KEY", "") or None
+
+# Function to get the pool of API keys: TOGETHER_API_KEYS (a list or comma-separated) plus TOGETHER_API_KEY
+def get_api_keys():
+    keys = load_secrets().get("TOGETHER_API_KEYS", os.environ.get("TOGETHER_API_KEYS", ""))
+    if isinstance(keys, str):
+        keys = keys.split(",")
+    keys = [key.strip() for key in keys if key.strip()]
+    primary = get_api_key()
+    if primary and primary not in keys:
+        keys.insert(0, primary)
+    return keys
@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+import contextlib
+
+from settings import get_setting
+from metrics import get_logger, metrics
+
+# File locks coordinate worker processes; not available on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+log = get_logger("singleflight")
+
+# One in-flight call, shared by every caller with the same key
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# Coalesces concurrent calls with the same key into a single execution
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    # Function to run fn once per key at a time; returns (result, whether this caller ran it)
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            metrics.inc("flashforge_coalesced_total", scope=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, True
+
+# Function to lock a key's lock file without blocking; returns the open file, or None if another holder has it
+def try_lock(path):
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # The previous holder removes the file on release; a lock on a removed file guards nothing
+        if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+            return lock_file
+    except (BlockingIOError, FileNotFoundError):
+        pass
+    lock_file.close()
+    return None
+
+# Hold an exclusive lock for a key across worker processes; yields True if another process held it first
+# Every key has its own lock file, removed on release, so unrelated requests never wait on each other
+@contextlib.contextmanager
+def process_lock(key):
+    lock_dir = get_setting("SINGLEFLIGHT_LOCK_DIR", os.path.join(".cache", "locks"))
+    if fcntl is None or not lock_dir:
+        yield False
+        return
+    os.makedirs(lock_dir, exist_ok=True)
+    timeout = get_setting("SINGLEFLIGHT_TIMEOUT", 300.0)
+    path = os.path.join(lock_dir, key + ".lock")
+    waited = False
+    deadline = time.monotonic() + timeout
+    lock_file = try_lock(path)
+    while lock_file is None:
+        if time.monotonic() > deadline:
+            # A stuck holder must not block everyone; go ahead without the lock
+            log.warning("Gave up waiting for the lock of %s after %.0fs", key[:12], timeout)
+            break
+        if not waited:
+            metrics.inc("flashforge_coalesced_total", scope="process")
+        waited = True
+        time.sleep(0.05)
+        lock_file = try_lock(path)
+    try:
+        yield waited
+    finally:
+        if lock_file is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
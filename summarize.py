@@ -0,0 +1,121 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+from settings import get_setting
+from chunking import PARAGRAPH_SPLIT, SENTENCE_SPLIT, count_tokens
+from retrieval import DIMENSIONS, normalize_rows, term_counts
+from metrics import get_logger, timed
+
+log = get_logger("summarize")
+
+# Lines that are only a page number, e.g. "12", "- 12 -", "Page 3", "3 of 10"
+PAGE_NUMBER_LINE = re.compile(r"^\W*(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?\W*$", re.IGNORECASE)
+LEADING_DIGITS = re.compile(r"^\s*(\d{1,4})")
+
+# Lines at the top and bottom of each page that are checked for headers and footers
+EDGE_LINES = 3
+
+# Function to normalize a header or footer line so that changing page numbers still match
+def boilerplate_key(line):
+    return re.sub(r"\d+", "#", " ".join(line.lower().split()))
+
+# Function to find the offset between PDF page indices and printed page numbers, if pages are numbered
+def page_number_offset(pages):
+    offsets = Counter()
+    for page_num, text in pages:
+        lines = [line for line in text.splitlines() if line.strip()]
+        candidates = set()
+        for line in lines[:EDGE_LINES] + lines[-EDGE_LINES:]:
+            match = LEADING_DIGITS.match(line)
+            if match:
+                # The number may be glued to the following text ("291Atoms"), so every prefix is a candidate
+                digits = match.group(1)
+                candidates.update(int(digits[:i]) - page_num for i in range(1, len(digits) + 1))
+        offsets.update(candidates)
+    if offsets:
+        offset, count = offsets.most_common(1)[0]
+        if count >= max(3, len(pages) // 2):
+            return offset
+    return None
+
+# Function to remove running headers, footers and page numbers from extracted PDF pages
+def strip_boilerplate(pages):
+    if len(pages) < 3:
+        return pages
+    # Edge lines that recur on many pages are headers or footers (odd and even pages often differ)
+    recurring = Counter()
+    for _, text in pages:
+        lines = [line for line in text.splitlines() if line.strip()]
+        recurring.update({boilerplate_key(line) for line in lines[:EDGE_LINES] + lines[-EDGE_LINES:]})
+    threshold = max(3, len(pages) * 0.3)
+    boilerplate = {key for key, count in recurring.items() if count >= threshold}
+    offset = page_number_offset(pages)
+
+    cleaned = []
+    for page_num, text in pages:
+        lines = text.splitlines()
+        nonblank = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(nonblank[:EDGE_LINES] + nonblank[-EDGE_LINES:])
+        kept = []
+        for i, line in enumerate(lines):
+            if i in edges:
+                if boilerplate_key(line) in boilerplate or PAGE_NUMBER_LINE.match(line):
+                    continue
+                # A printed page number glued to the first or last line of the page
+                if offset is not None and line.lstrip().startswith(str(page_num + offset)):
+                    line = line.lstrip()[len(str(page_num + offset)):]
+            kept.append(line)
+        cleaned.append((page_num, "\n".join(kept)))
+    return cleaned
+
+# Function to split text into sentences, keeping paragraph order
+def split_sentences(text):
+    return [
+        " ".join(sentence.split())
+        for paragraph in PARAGRAPH_SPLIT.split(text)
+        for sentence in SENTENCE_SPLIT.split(paragraph.strip())
+        if sentence.strip()
+    ]
+
+# Function to score sentences by TextRank over their TF-IDF similarity graph
+def textrank_scores(sentences, damping=0.85, iterations=30):
+    counts = np.zeros((len(sentences), DIMENSIONS), dtype=np.float32)
+    for row, sentence in enumerate(sentences):
+        ids, values = term_counts(sentence)
+        counts[row, ids] = values
+    frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log1p(len(sentences) / (frequency + 1.0)).astype(np.float32)
+    vectors = normalize_rows(counts * idf)
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    # Row-normalized transition matrix; sentences without links spread their score evenly
+    totals = similarity.sum(axis=1, keepdims=True)
+    transition = np.where(totals > 0, similarity / np.where(totals > 0, totals, 1.0), 1.0 / len(sentences))
+    scores = np.full(len(sentences), 1.0 / len(sentences), dtype=np.float32)
+    for _ in range(iterations):
+        scores = (1 - damping) / len(sentences) + damping * (transition.T @ scores)
+    return scores
+
+# Function to keep the most central sentences of a text, in their original order, within ratio of its tokens
+@timed("summarize")
+def summarize_text(text, ratio=None):
+    if ratio is None:
+        ratio = get_setting("SUMMARY_RATIO", 1.0)
+    total_tokens = count_tokens(text)
+    if ratio >= 1.0 or total_tokens < get_setting("SUMMARY_MIN_TOKENS", 1000):
+        return text
+    sentences = split_sentences(text)
+    if len(sentences) < 3:
+        return text
+    tokens = [count_tokens(sentence) for sentence in sentences]
+    budget = total_tokens * ratio
+    selected = []
+    used = 0
+    for i in np.argsort(-textrank_scores(sentences), kind="stable"):
+        if used + tokens[i] <= budget:
+            selected.append(i)
+            used += tokens[i]
+    log.info("Condensed text from %d to %d tokens (%d of %d sentences)", total_tokens, used, len(selected), len(sentences))
+    return " ".join(sentences[i] for i in sorted(selected))
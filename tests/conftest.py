@@ -0,0 +1,24 @@
+import os
+import sys
+
+# The modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Tests run offline against the deterministic fake backend, without persistent caches or lock files
+os.environ.update({
+    "GENERATION_BACKEND": "fake",
+    "TRANSLATION_BACKEND": "fake",
+    "LLM_CACHE_PATH": "",
+    "TEXT_CACHE_PATH": "",
+    "TRANSLATION_CACHE_PATH": "",
+    "JOB_STORE_PATH": "",
+    "SINGLEFLIGHT_LOCK_DIR": "",
+    "LOG_LEVEL": "WARNING",
+})
+
+import settings
+
+# Settings come from the environment only, so a local secrets.toml cannot point the tests at a real API
+settings.SECRETS_PATHS.clear()
+settings.load_secrets.cache_clear()
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import fake_llm
+from backends import complete, missing_api_keys, route, stream_complete
+from pipeline import generate_qa_pairs, translate_qa_pairs
+from test_qa_parser import EXPECTED, TRAILING_PROSE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="module")
+def sample_text():
+    with open(os.path.join(ROOT, "sample_text.txt"), encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture
+def trailing_prose(monkeypatch):
+    monkeypatch.setattr(fake_llm, "completion_text", lambda body, canned: TRAILING_PROSE)
+
+def test_tasks_route_to_the_fake_backend():
+    assert route("generation").name == "fake"
+    assert route("translation").name == "fake"
+    assert missing_api_keys() == []
+
+def test_fake_backend_is_deterministic():
+    prompt = "Task: create exactly 3 medium difficulty Q&A pairs.\n\nText to analyze: Some text. [/INST]"
+    assert complete(prompt, 200) == complete(prompt, 200)
+    assert "".join(stream_complete(prompt, 200)) == complete(prompt, 200)
+
+def test_generate_returns_requested_cards(sample_text):
+    cards = generate_qa_pairs(sample_text, 8, "Medium", "Physics")
+    assert len(cards) == 8
+    assert all(card["question"] and card["answer"] for card in cards)
+
+def test_streamed_generation_delivers_every_card(sample_text):
+    streamed = []
+    cards = generate_qa_pairs(sample_text, 8, "Medium", "Physics", on_card=streamed.append)
+    assert [card["question"] for card in cards] == [card["question"] for card in streamed]
+
+def test_generation_drops_trailing_prose(sample_text, trailing_prose):
+    cards = generate_qa_pairs(sample_text, 2, "Medium", "Physics")
+    assert [{"question": c["question"], "answer": c["answer"]} for c in cards] == EXPECTED
+
+def test_streamed_generation_drops_trailing_prose(sample_text, trailing_prose):
+    cards = generate_qa_pairs(sample_text, 2, "Medium", "Physics", on_card=lambda qa: None)
+    assert [{"question": c["question"], "answer": c["answer"]} for c in cards] == EXPECTED
+
+def test_translation_keeps_card_order():
+    cards = [{"question": f"Question {i}?", "answer": f"Answer {i}."} for i in range(5)]
+    translated = translate_qa_pairs(cards, "Spanish")
+    assert translated == [{"question": f"[tr] Question {i}?", "answer": f"[tr] Answer {i}."} for i in range(5)]
@@ -0,0 +1,46 @@
+import time
+
+from caches import LRUCache, ResponseCache, TieredCache
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=10)
+    cache.set("a", 1, 4)
+    cache.set("b", 2, 4)
+    assert cache.get("a") == 1
+    cache.set("c", 3, 4)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    # Values larger than the whole cache are not stored
+    cache.set("d", 4, 11)
+    assert cache.get("d") is None
+
+def test_response_cache_key_ignores_whitespace_and_stream():
+    key = ResponseCache.make_key({"prompt": "Hello   world\n", "max_tokens": 10})
+    assert key == ResponseCache.make_key({"prompt": "Hello world", "max_tokens": 10, "stream": True})
+    assert key != ResponseCache.make_key({"prompt": "Hello world", "max_tokens": 20})
+
+def test_response_cache_expiry_and_size_limit(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=10, ttl=3600)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    assert cache.get("a") == "12345"
+    time.sleep(0.01)
+    # Over the size limit the least recently used entry goes
+    cache.set("c", "12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345"
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["hits"] == 2 and stats["misses"] == 1
+
+    expired = ResponseCache(str(tmp_path / "expired.sqlite3"), max_bytes=100, ttl=-1)
+    expired.set("a", "x")
+    assert expired.get("a") is None
+
+def test_tiered_cache_reads_through_from_disk(tmp_path):
+    path = str(tmp_path / "tiered.sqlite3")
+    TieredCache(1024, path=path, max_bytes=1024, ttl=3600).set("doc", {"text": "hello"})
+    # A new process starts with an empty memory tier
+    cache = TieredCache(1024, path=path, max_bytes=1024, ttl=3600)
+    assert cache.get("doc") == {"text": "hello"}
+    cache.set("local", [1], persist=False)
+    assert TieredCache(1024, path=path, max_bytes=1024, ttl=3600).get("local") is None
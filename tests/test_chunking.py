@@ -0,0 +1,31 @@
+from chunking import allocate_questions, chunk_coverage, chunk_text, count_tokens
+
+SENTENCES = [f"Sentence number {i} talks about topic {i} in some detail." for i in range(60)]
+
+def test_chunks_fit_the_budget_and_overlap():
+    chunks = chunk_text(" ".join(SENTENCES), chunk_tokens=60, overlap_tokens=15)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+    # Each chunk starts with the last sentence of the one before
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.startswith(previous.rsplit(". ", 1)[-1])
+    assert SENTENCES[0] in chunks[0] and SENTENCES[-1] in chunks[-1]
+
+def test_oversized_sentences_are_split_on_words():
+    chunks = chunk_text(" ".join(["word"] * 500), chunk_tokens=50, overlap_tokens=0)
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    assert sum(len(chunk.split()) for chunk in chunks) == 500
+
+def test_allocate_questions_is_proportional():
+    chunks = ["alpha " * 300, "beta " * 100, "gamma " * 100]
+    counts = allocate_questions(chunks, 10)
+    assert sum(counts) == 10
+    assert counts[0] > counts[1]
+    assert allocate_questions(["", ""], 5) == [0, 0]
+
+def test_chunk_coverage():
+    chunks = ["photosynthesis converts sunlight energy", "mitochondria produce cellular energy"]
+    cards = [{"question": "What does photosynthesis do?", "answer": "It converts sunlight into energy."}]
+    covered, uncovered = chunk_coverage(chunks, cards)
+    assert covered == 1.0
+    assert uncovered == 0.25
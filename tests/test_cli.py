@@ -0,0 +1,41 @@
+import json
+import os
+import shutil
+
+import cli
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(tmp_path, capsys, *argv):
+    code = cli.main([*argv, "--out-dir", str(tmp_path / "decks"), "--num-questions", "3", "--workers", "1"])
+    return code, capsys.readouterr().out
+
+def test_resume_skips_done_decks_and_exports_new_formats(tmp_path, capsys):
+    document = tmp_path / "notes.txt"
+    shutil.copy(os.path.join(ROOT, "sample_text.txt"), document)
+
+    code, out = run(tmp_path, capsys, str(document), "--formats", "csv")
+    assert code == 0
+    assert "Done" in out
+    assert (tmp_path / "decks" / "notes.csv").exists()
+
+    code, out = run(tmp_path, capsys, str(document), "--formats", "csv")
+    assert code == 0
+    assert "(already done)" in out
+
+    # A deck done in other formats is not done for a new one
+    code, out = run(tmp_path, capsys, str(document), "--formats", "apkg")
+    assert code == 0
+    assert "(already done)" not in out
+    assert (tmp_path / "decks" / "notes.apkg").exists()
+
+def test_manifest_entry_without_path_fails_on_its_own(tmp_path, capsys):
+    shutil.copy(os.path.join(ROOT, "sample_text.txt"), tmp_path / "notes.txt")
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps([{"name": "x"}, {"path": "notes.txt"}]), encoding="utf-8")
+
+    code, out = run(tmp_path, capsys, "--manifest", str(manifest), "--formats", "json")
+    assert code == 1
+    assert "Failed {'name': 'x'}: the entry has no 'path'" in out
+    assert "1 succeeded, 1 failed" in out
+    assert (tmp_path / "decks" / "notes.json").exists()
@@ -0,0 +1,26 @@
+from dedup import deduplicate_cards
+
+def card(question, answer):
+    return {"question": question, "answer": answer}
+
+def test_near_duplicates_are_dropped():
+    cards = [
+        card("What is photosynthesis?", "The process plants use to turn light into chemical energy."),
+        card("What is the capital of France?", "Paris."),
+        card("what is photosynthesis", "The process plants use to turn light into chemical energy"),
+        card("What is photosynthesis?", "The process plants use to turn light into chemical energy."),
+    ]
+    assert deduplicate_cards(cards) == cards[:2]
+
+def test_distinct_cards_are_kept_in_order():
+    cards = [
+        card("Who wrote Hamlet?", "William Shakespeare."),
+        card("What is the boiling point of water at sea level?", "100 degrees Celsius."),
+        card("What does DNA stand for?", "Deoxyribonucleic acid."),
+    ]
+    assert deduplicate_cards(cards) == cards
+
+def test_short_decks():
+    only = [card("Q?", "A.")]
+    assert deduplicate_cards([]) == []
+    assert deduplicate_cards(only) == only
@@ -0,0 +1,45 @@
+import io
+import csv
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from exporters import export_bundle, export_bytes, export_csv, export_json, export_jsonl
+
+# More cards than one serialized chunk, with characters that need quoting or escaping
+CARDS = [{"question": f"Question {i}, \"quoted\"?", "answer": f"Answer {i}\nwith é & <b>"} for i in range(2500)]
+
+def test_text_formats_round_trip_across_chunks():
+    assert json.loads(export_json(CARDS)) == CARDS
+    assert [json.loads(line) for line in export_jsonl(CARDS).splitlines()] == CARDS
+    rows = list(csv.reader(io.StringIO(export_csv(CARDS))))
+    assert rows[0] == ["Question", "Answer"]
+    assert rows[1:] == [[qa["question"], qa["answer"]] for qa in CARDS]
+    assert export_json([]) == "[]"
+
+def test_apkg_holds_a_collection_with_every_card(tmp_path):
+    with zipfile.ZipFile(io.BytesIO(export_bytes(CARDS, "apkg", title="Biology"))) as package:
+        assert sorted(package.namelist()) == ["collection.anki2", "media"]
+        package.extract("collection.anki2", tmp_path)
+    conn = sqlite3.connect(str(tmp_path / "collection.anki2"))
+    try:
+        decks = json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+        notes = conn.execute("SELECT flds FROM notes ORDER BY id").fetchall()
+        cards = conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+    finally:
+        conn.close()
+    assert "Biology" in {deck["name"] for deck in decks.values()}
+    assert len(notes) == cards == len(CARDS)
+    assert notes[0][0] == "Question 0, &quot;quoted&quot;?\x1fAnswer 0<br>with é &amp; &lt;b&gt;"
+
+def test_bundle_has_one_file_per_format():
+    with zipfile.ZipFile(io.BytesIO(export_bundle(CARDS[:3], ["csv", "json", "apkg"]))) as bundle:
+        assert sorted(bundle.namelist()) == ["flashcards.apkg", "flashcards.csv", "flashcards.json"]
+        assert json.loads(bundle.read("flashcards.json")) == CARDS[:3]
+
+def test_parquet_round_trip():
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pq.read_table(io.BytesIO(export_bytes(CARDS, "parquet")))
+    assert table.column("question").to_pylist() == [qa["question"] for qa in CARDS]
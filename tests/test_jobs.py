@@ -0,0 +1,60 @@
+import os
+import time
+import socket
+
+from jobs import DONE, FAILED, Job, JobQueue, JobStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(ROOT, "sample_text.txt"), encoding="utf-8") as f:
+    SAMPLE_TEXT = f.read()
+
+def wait_for(queue, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = queue.get(job_id)
+        if snapshot["status"] in (DONE, FAILED):
+            return snapshot
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_generate_job_publishes_cards_and_result():
+    queue = JobQueue(max_workers=1)
+    job_id = queue.submit("generate", text=SAMPLE_TEXT, num_questions=3, difficulty="Easy", subject="General")
+    snapshot = wait_for(queue, job_id)
+    assert snapshot["status"] == DONE
+    assert snapshot["result"]
+    # Cards were published while the job ran
+    assert snapshot["partial"]
+    assert snapshot["progress"] > 0
+    assert queue.get("unknown") is None
+
+def test_bad_input_is_an_expected_failure():
+    queue = JobQueue(max_workers=1)
+    snapshot = wait_for(queue, queue.submit("generate", text="Too short.", num_questions=3, difficulty="Easy", subject="General"))
+    assert snapshot["status"] == FAILED
+    assert snapshot["expected_error"]
+    assert "too short" in snapshot["error"]
+
+def test_translate_job_reports_progress():
+    queue = JobQueue(max_workers=1)
+    cards = [{"question": "What is water made of?", "answer": "Hydrogen and oxygen."}]
+    snapshot = wait_for(queue, queue.submit("translate", qa_pairs=cards, target_language="French"))
+    assert snapshot["status"] == DONE
+    assert len(snapshot["result"]) == 1
+    assert snapshot["progress"] == 1.0
+
+def test_store_outlives_the_queue_and_finds_orphans(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue(max_workers=1, store=store)
+    job_id = queue.submit("generate", text=SAMPLE_TEXT, num_questions=3, difficulty="Easy", subject="General")
+    result = wait_for(queue, job_id)["result"]
+    # Another worker process (or a restart) reads the finished job from the store
+    assert JobQueue(store=JobStore(str(tmp_path / "jobs.sqlite3"))).get(job_id)["result"] == result
+
+    # An unfinished job of a process that has exited is picked up again
+    params = {"qa_pairs": [], "target_language": "French"}
+    store.save(Job("orphan", "translate", params, 0))
+    store.conn.execute("UPDATE jobs SET owner = ? WHERE id = 'orphan'", (f"{socket.gethostname()}:999999999",))
+    store.conn.commit()
+    assert store.orphaned() == [("orphan", "translate", params)]
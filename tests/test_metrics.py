@@ -0,0 +1,24 @@
+from metrics import Metrics
+
+def test_render_with_mixed_label_types():
+    metrics = Metrics()
+    metrics.inc("flashforge_http_requests_total", status=200, backend="together")
+    metrics.inc("flashforge_http_requests_total", status="connection_error", backend="together")
+    metrics.inc("flashforge_http_requests_total", status=200, backend="together")
+    metrics.observe("flashforge_stage_seconds", 0.2, stage="http")
+    text = metrics.render()
+    assert 'flashforge_http_requests_total{backend="together",status="200"} 2' in text
+    assert 'flashforge_http_requests_total{backend="together",status="connection_error"} 1' in text
+    assert 'flashforge_stage_seconds_bucket{stage="http",le="0.25"} 1' in text
+    assert 'flashforge_stage_seconds_count{stage="http"} 1' in text
+
+def test_cache_hit_rates():
+    metrics = Metrics()
+    for result in ("hit", "hit", "hit", "miss"):
+        metrics.inc("flashforge_cache_requests_total", cache="llm", result=result)
+    assert metrics.cache_hit_rates() == {"llm": 0.75}
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc("flashforge_jobs_total", kind='say "hi"\n', status="done")
+    assert 'kind="say \\"hi\\"\\n"' in metrics.render()
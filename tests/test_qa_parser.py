@@ -0,0 +1,50 @@
+import json
+
+from qa_parser import QAStreamParser, parse_qa_json, parse_qa_text
+
+TRAILING_PROSE = "Q: What is F?\nA: Force.\n\nQ: What is E?\nA: Energy.\n\nThese flashcards cover the key concepts."
+
+EXPECTED = [
+    {"question": "What is F?", "answer": "Force."},
+    {"question": "What is E?", "answer": "Energy."},
+]
+
+# Function to feed a response to a stream parser a few characters at a time
+def stream(text, output_format="text", step=5):
+    parser = QAStreamParser(output_format)
+    pairs = []
+    for i in range(0, len(text), step):
+        pairs.extend(parser.feed(text[i:i + step]))
+    return pairs + parser.close()
+
+def test_text_drops_trailing_prose():
+    assert parse_qa_text(TRAILING_PROSE) == EXPECTED
+
+def test_stream_drops_trailing_prose():
+    assert stream(TRAILING_PROSE) == EXPECTED
+
+def test_text_keeps_multi_paragraph_answers_before_the_next_pair():
+    text = "Q: Steps?\nA: First.\n\nThen second.\n\nQ: Next?\nA: Done."
+    assert parse_qa_text(text)[0]["answer"] == "First.\n\nThen second."
+    assert stream(text)[0]["answer"] == "First.\n\nThen second."
+
+def test_text_tolerates_numbering_and_bold_markers():
+    text = "1. **Question:** What is F?\n**Answer:** Force.\n2. Q: What is E?\nA: Energy."
+    assert parse_qa_text(text) == EXPECTED
+
+def test_json_repairs_truncated_response():
+    text = '{"cards": [{"question": "What is F?", "answer": "Force."}, {"question": "What is E?", "answer": "Energy."}, {"quest'
+    assert parse_qa_json(text) == EXPECTED
+
+def test_json_stream_emits_cards_as_they_close():
+    text = 'Here you go: ' + json.dumps({"cards": EXPECTED + [{"question": 'A "quoted" {brace}?', "answer": "[x]"}]})
+    parser = QAStreamParser("json")
+    first = parser.feed(text[:text.index("Energy")])
+    assert first == EXPECTED[:1]
+    rest = parser.feed(text[text.index("Energy"):])
+    assert rest == EXPECTED[1:] + [{"question": 'A "quoted" {brace}?', "answer": "[x]"}]
+    assert parser.close() == []
+
+def test_json_stream_matches_batch_parse_for_truncated_response():
+    text = json.dumps({"cards": EXPECTED})[:-10]
+    assert stream(text, "json", step=3) == parse_qa_json(text)
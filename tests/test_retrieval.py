@@ -0,0 +1,34 @@
+from retrieval import ChunkIndex, term_counts
+
+TOPICS = [
+    "Electrons orbit the nucleus. Electron energy levels are quantized in the atom.",
+    "Photosynthesis converts sunlight into chemical energy in plant chloroplasts.",
+    "The French revolution began in 1789 and ended the monarchy in France.",
+    "Electron orbits and atomic energy levels explain the hydrogen spectrum lines.",
+]
+
+# Function to build an index with one chunk per topic
+def topic_index():
+    return ChunkIndex(TOPICS, [term_counts(chunk) for chunk in TOPICS])
+
+def test_plan_allocates_every_card():
+    assert sum(topic_index().plan(7, cards_per_chunk=2)) == 7
+
+def test_plan_clamps_cards_per_chunk():
+    # Zero or negative settings used to loop forever
+    assert sum(topic_index().plan(3, cards_per_chunk=0)) == 3
+    assert sum(topic_index().plan(3, cards_per_chunk=-5)) == 3
+
+def test_plan_spreads_picks_across_topics():
+    counts = topic_index().plan(4, cards_per_chunk=1)
+    assert sum(1 for count in counts if count) >= 3
+
+def test_plan_skips_covered_chunks():
+    covered = [{"question": "What happened in 1789?", "answer": "The French revolution began and ended the monarchy in France."}]
+    counts = topic_index().plan(1, cards_per_chunk=1, qa_pairs=covered)
+    assert counts[2] == 0
+
+def test_index_round_trips_through_dict():
+    index = topic_index()
+    restored = ChunkIndex.from_dict(index.to_dict())
+    assert restored.plan(5, cards_per_chunk=2) == index.plan(5, cards_per_chunk=2)
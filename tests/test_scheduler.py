@@ -0,0 +1,59 @@
+import time
+import threading
+
+import pytest
+
+from scheduler import BATCH, INTERACTIVE, RequestScheduler, SchedulerBusy
+
+# Function to make a scheduler with one key and one request slot
+def single_slot(**kwargs):
+    return RequestScheduler(["key"], requests_per_minute=100000, tokens_per_minute=10000000, max_concurrency=1, **kwargs)
+
+# Function to start a thread that waits for a slot and records its name once served
+def wait_for_slot(scheduler, name, priority, served):
+    def run():
+        with scheduler.slot(10, priority):
+            served.append(name)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+# Function to wait until a number of requests are queued
+def wait_queued(scheduler, count):
+    deadline = time.monotonic() + 5
+    while len(scheduler.waiting) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_interactive_requests_are_served_before_batch():
+    scheduler = single_slot()
+    served = []
+    with scheduler.slot(10):
+        threads = [wait_for_slot(scheduler, "batch", BATCH, served)]
+        wait_queued(scheduler, 1)
+        threads.append(wait_for_slot(scheduler, "interactive", INTERACTIVE, served))
+        wait_queued(scheduler, 2)
+    for thread in threads:
+        thread.join(5)
+    assert served == ["interactive", "batch"]
+
+def test_slot_wait_raises_scheduler_busy():
+    scheduler = single_slot(max_wait=0.1)
+    with scheduler.slot(10):
+        with pytest.raises(SchedulerBusy):
+            with scheduler.slot(10):
+                pass
+    # The slot is free again afterwards
+    with scheduler.slot(10):
+        pass
+
+def test_admit_turns_batch_work_away_first():
+    scheduler = single_slot(max_queue=2)
+    served = []
+    with scheduler.slot(10):
+        thread = wait_for_slot(scheduler, "queued", INTERACTIVE, served)
+        wait_queued(scheduler, 1)
+        with pytest.raises(SchedulerBusy):
+            scheduler.admit(BATCH)
+        scheduler.admit(INTERACTIVE)
+    thread.join(5)
+    assert served == ["queued"]
@@ -0,0 +1,85 @@
+import os
+import threading
+
+import pytest
+
+from singleflight import SingleFlight, fcntl, process_lock
+
+def run_concurrently(count, target):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_calls_with_one_key_run_once():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        # Long enough for the other callers to join this call
+        threading.Event().wait(0.2)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    leader.start()
+    started.wait(5)
+    results.extend(run_concurrently(4, lambda: flight.do("key", work)))
+    leader.join()
+    assert len(calls) == 1
+    assert sorted(results, key=lambda result: result[1]) == [("result", False)] * 4 + [("result", True)]
+    # Once finished, the key runs again
+    assert flight.do("key", lambda: "again") == ("again", True)
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight("test")
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        threading.Event().wait(0.2)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    run_concurrently(3, call)
+    leader.join()
+    assert len(errors) == 4 and all(str(e) == "boom" for e in errors)
+
+@pytest.mark.skipif(fcntl is None, reason="file locks need fcntl")
+def test_process_lock_waits_for_the_holder_and_cleans_up(tmp_path, monkeypatch):
+    monkeypatch.setenv("SINGLEFLIGHT_LOCK_DIR", str(tmp_path))
+    waited = []
+    with process_lock("key") as first:
+        assert not first
+        assert os.path.exists(tmp_path / "key.lock")
+        # A second holder (its own lock file handle, as in another process) waits for the first
+        waiter = threading.Thread(target=lambda: waited.append(enter_lock("key")))
+        waiter.start()
+        waiter.join(0.3)
+        assert waiter.is_alive()
+        # Other keys do not wait
+        with process_lock("other") as other:
+            assert not other
+    waiter.join(5)
+    assert waited == [True]
+    assert os.listdir(tmp_path) == []
+
+def enter_lock(key):
+    with process_lock(key) as waited:
+        return waited
@@ -0,0 +1,48 @@
+import pytest
+
+import together
+from scheduler import RequestScheduler, SchedulerBusy
+from together import TOGETHER_SAMPLING, CircuitBreaker, Endpoint, ServiceUnavailable, generate_with_together, stream_with_together
+
+# Stand-in for a requests response with a status code and no body
+class StatusResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {"Retry-After": "0"}
+        self.text = "error"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+# Function to make an endpoint whose every request is answered with a status code
+def failing_endpoint(monkeypatch, status_code, failure_threshold=2):
+    monkeypatch.setenv("TOGETHER_MAX_RETRIES", "0")
+    monkeypatch.setattr(together, "post_with_key", lambda *args, **kwargs: StatusResponse(status_code))
+    scheduler = RequestScheduler(["key"], requests_per_minute=100000, tokens_per_minute=10000000, max_wait=5.0)
+    breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=60.0)
+    return Endpoint("test", "http://127.0.0.1:9/v1/completions", "model", scheduler, breaker, TOGETHER_SAMPLING)
+
+def test_rate_limits_do_not_open_the_breaker(monkeypatch):
+    endpoint = failing_endpoint(monkeypatch, 429)
+    for i in range(5):
+        assert generate_with_together(f"prompt {i}", 10, endpoint=endpoint) is None
+    assert "".join(stream_with_together("streamed prompt", 10, endpoint=endpoint)) == ""
+    assert endpoint.circuit_breaker.allow()
+
+def test_server_errors_open_the_breaker(monkeypatch):
+    endpoint = failing_endpoint(monkeypatch, 503)
+    for i in range(2):
+        assert generate_with_together(f"prompt {i}", 10, endpoint=endpoint) is None
+    assert not endpoint.circuit_breaker.allow()
+
+def test_open_breaker_raises_an_expected_error(monkeypatch):
+    endpoint = failing_endpoint(monkeypatch, 503, failure_threshold=1)
+    endpoint.circuit_breaker.record_failure()
+    # Jobs report SchedulerBusy as a message to the user instead of finishing with an empty deck
+    with pytest.raises(SchedulerBusy):
+        generate_with_together("prompt", 10, endpoint=endpoint)
+    with pytest.raises(ServiceUnavailable):
+        list(stream_with_together("prompt", 10, endpoint=endpoint))
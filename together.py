@@ -0,0 +1,378 @@
+import json
+import time
+import queue
+import random
+import threading
+import functools
+import contextvars
+from email.utils import parsedate_to_datetime
+
+from settings import get_setting
+from caches import ResponseCache, get_response_cache
+from chunking import count_tokens
+from metrics import get_logger, metrics, span
+from scheduler import SchedulerBusy, get_scheduler
+from singleflight import SingleFlight, process_lock
+
+log = get_logger("together")
+
+TOGETHER_URL = "https://api.together.xyz/v1/completions"
+TOGETHER_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
+
+# Sampling parameters sent with every Together AI request
+TOGETHER_SAMPLING = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "top_k": 50,
+    "repetition_penalty": 1.1,
+    "stop": ["</s>", "[INST]"]
+}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Identical requests in flight at the same time share one upstream call
+request_flight = SingleFlight("request")
+
+# Raised while the circuit breaker is open; a busy service, so callers report it like a full queue
+class ServiceUnavailable(SchedulerBusy):
+    pass
+
+# Simple circuit breaker shared by all sessions of the process
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            # Half-open: let a single probe through once the cool-down has passed
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+# Initialize a pooled keep-alive HTTP session for Together AI
+@functools.cache
+def get_http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_size = get_setting("TOGETHER_POOL_SIZE", 10)
+    session = requests.Session()
+    # Retries are handled in generate_with_together so Retry-After is honoured
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # The Authorization header is set per request by the key the scheduler picks
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+@functools.cache
+def get_circuit_breaker():
+    return CircuitBreaker(
+        failure_threshold=get_setting("TOGETHER_BREAKER_THRESHOLD", 5),
+        reset_timeout=get_setting("TOGETHER_BREAKER_RESET", 30.0)
+    )
+
+# A model on an OpenAI-compatible completions endpoint (Together AI, or a local llama.cpp / vLLM server)
+# Endpoints of the same backend share its scheduler (keys, rate limits, concurrency) and circuit breaker
+class Endpoint:
+    def __init__(self, name, api_url, model, scheduler, circuit_breaker, sampling):
+        self.name = name
+        self.api_url = api_url
+        self.model = model
+        self.scheduler = scheduler
+        self.circuit_breaker = circuit_breaker
+        self.sampling = sampling
+
+    def payload(self, prompt, max_tokens=1024, stream=False, response_format=None):
+        return build_together_payload(prompt, max_tokens, stream, response_format, self.model, self.sampling)
+
+    def cache_key(self, data):
+        # Together AI keys predate other backends and stay valid; other servers are kept apart by URL
+        return ResponseCache.make_key(data if self.name == "together" else dict(data, api_url=self.api_url))
+
+    def generate(self, prompt, max_tokens=1024, response_format=None):
+        return generate_with_together(prompt, max_tokens, response_format, self)
+
+    def stream(self, prompt, max_tokens=1024, response_format=None):
+        return stream_with_together(prompt, max_tokens, response_format, self)
+
+# Function to get a Together AI endpoint for a model (TOGETHER_MODEL by default)
+@functools.cache
+def get_together_endpoint(model=None):
+    return Endpoint(
+        "together",
+        get_api_url(),
+        model or get_setting("TOGETHER_MODEL", TOGETHER_MODEL),
+        get_scheduler(),
+        get_circuit_breaker(),
+        TOGETHER_SAMPLING
+    )
+
+# Function to compute the wait before the next retry attempt
+def retry_delay(attempt, response=None, base=0.5, cap=20.0):
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(cap, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(cap, max(0.0, wait))
+                except Exception:
+                    pass
+    # Full jitter exponential backoff
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+# Function to count the token usage reported in a response and charge it to the key's budget
+def record_usage(usage, slot=None, backend="together"):
+    if usage:
+        metrics.inc("flashforge_tokens_total", usage.get("prompt_tokens") or 0, kind="prompt", backend=backend)
+        metrics.inc("flashforge_tokens_total", usage.get("completion_tokens") or 0, kind="completion", backend=backend)
+        if slot is not None:
+            slot.record_usage((usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0))
+
+# Function to estimate the tokens a request will use, reserved from the key's tokens-per-minute budget
+def estimate_request_tokens(prompt, max_tokens):
+    return count_tokens(prompt) + max_tokens
+
+# Function to send a completion request on a key chosen by the scheduler (local servers may need no key)
+def post_with_key(slot, api_url, data, **kwargs):
+    headers = {"Authorization": f"Bearer {slot.key}"} if slot.key else {}
+    return get_http_session().post(api_url, json=data, headers=headers, **kwargs)
+
+# Function to build the completion request body
+def build_together_payload(prompt, max_tokens=1024, stream=False, response_format=None, model=TOGETHER_MODEL, sampling=TOGETHER_SAMPLING):
+    data = {"model": model, "prompt": prompt, "max_tokens": max_tokens, **sampling}
+    if stream:
+        data["stream"] = True
+    # JSON mode, e.g. {"type": "json_object", "schema": {...}}
+    if response_format:
+        data["response_format"] = response_format
+    return data
+
+# Function to get the completions endpoint (overridable, e.g. to point at a local mock server)
+def get_api_url():
+    return get_setting("TOGETHER_API_URL", TOGETHER_URL)
+
+def get_request_timeout():
+    return (get_setting("TOGETHER_CONNECT_TIMEOUT", 5.0), get_setting("TOGETHER_READ_TIMEOUT", 120.0))
+
+# Function to generate a completion (from Together AI unless another endpoint is given)
+def generate_with_together(prompt, max_tokens=1024, response_format=None, endpoint=None):
+    endpoint = endpoint or get_together_endpoint()
+    data = endpoint.payload(prompt, max_tokens, response_format=response_format)
+    cache_key = endpoint.cache_key(data)
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            log.debug("Using cached %s response", endpoint.name)
+            return cached
+
+    result, _ = request_flight.do(cache_key, lambda: locked_completion(endpoint, data, cache_key, prompt, max_tokens))
+    return result
+
+# Function to send a request unless another worker process already answered it while we waited
+def locked_completion(endpoint, data, cache_key, prompt, max_tokens):
+    response_cache = get_response_cache()
+    if response_cache is None:
+        # Without the shared cache a waiting worker could not reuse the response, so there is nothing to wait for
+        return request_completion(endpoint, data, cache_key, prompt, max_tokens)
+    with process_lock(cache_key) as waited:
+        if waited:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                log.debug("Using %s response from another worker", endpoint.name)
+                return cached
+        return request_completion(endpoint, data, cache_key, prompt, max_tokens)
+
+# Function to send a completion request, retrying transient errors
+def request_completion(endpoint, data, cache_key, prompt, max_tokens):
+    import requests
+
+    response_cache = get_response_cache()
+    circuit_breaker = endpoint.circuit_breaker
+    max_retries = get_setting("TOGETHER_MAX_RETRIES", 3)
+    timeout = get_request_timeout()
+    tokens = estimate_request_tokens(prompt, max_tokens)
+
+    for attempt in range(max_retries + 1):
+        if not circuit_breaker.allow():
+            log.warning("Circuit breaker open, skipping request to %s", endpoint.name)
+            raise ServiceUnavailable(f"The {endpoint.name} model service is failing right now. Please try again in a minute.")
+
+        response = None
+        try:
+            log.info("Sending request to %s (%s)...", endpoint.name, endpoint.model)
+            with endpoint.scheduler.slot(tokens) as slot:
+                with span("http"):
+                    response = post_with_key(slot, endpoint.api_url, data, timeout=timeout)
+                metrics.inc("flashforge_http_requests_total", status=response.status_code, backend=endpoint.name)
+                if response.status_code == 200:
+                    body = response.json()
+                    record_usage(body.get("usage"), slot, endpoint.name)
+                elif response.status_code == 429:
+                    # Pause this key; the retry goes to whichever key is free soonest
+                    slot.rate_limited(retry_delay(attempt, response))
+
+            if response.status_code == 200:
+                result = body["choices"][0]["text"].strip()
+                circuit_breaker.record_success()
+                if response_cache is not None and result:
+                    response_cache.set(cache_key, result)
+                log.debug("%s response: %s", endpoint.name, result)
+                return result
+
+            log.warning("%s error %s: %s", endpoint.name, response.status_code, response.text)
+            if response.status_code not in RETRYABLE_STATUS:
+                return None
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc("flashforge_http_requests_total", status="connection_error", backend=endpoint.name)
+            log.warning("Connection error in generate_with_together: %s", e)
+        except SchedulerBusy:
+            # No key became free in time: the caller reports it instead of returning an empty deck
+            raise
+        except Exception as e:
+            log.error("Error in generate_with_together: %s", e)
+            return None
+
+        # A 429 only means this key is out of budget; the scheduler already pauses it, and other keys may be fine
+        if response is None or response.status_code != 429:
+            circuit_breaker.record_failure()
+        if attempt < max_retries:
+            # A rate-limited key is already paused by the scheduler, so only the jittered backoff applies
+            delay = retry_delay(attempt, None if response is not None and response.status_code == 429 else response)
+            log.info("Retrying in %.1fs (attempt %d/%d)...", delay, attempt + 2, max_retries + 1)
+            time.sleep(delay)
+
+    return None
+
+# Function to stream generated text as tokens arrive (from Together AI unless another endpoint is given)
+def stream_with_together(prompt, max_tokens=1024, response_format=None, endpoint=None):
+    endpoint = endpoint or get_together_endpoint()
+    data = endpoint.payload(prompt, max_tokens, stream=True, response_format=response_format)
+    cache_key = endpoint.cache_key(data)
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            log.debug("Using cached %s response", endpoint.name)
+            yield cached
+            return
+
+    if not endpoint.circuit_breaker.allow():
+        log.warning("Circuit breaker open, skipping request to %s", endpoint.name)
+        raise ServiceUnavailable(f"The {endpoint.name} model service is failing right now. Please try again in a minute.")
+
+    received = []
+    if response_cache is None:
+        yield from stream_completion(endpoint, data, cache_key, prompt, max_tokens, received)
+    else:
+        yield from locked_stream(endpoint, data, cache_key, prompt, max_tokens, received)
+
+    # Nothing streamed: fall back to the retrying non-streaming path
+    if not received:
+        result = generate_with_together(prompt, max_tokens, response_format, endpoint)
+        if result:
+            yield result
+
+# Function to stream a completion unless another worker process already answered it while we waited
+# The lock is held by a helper thread for the request only, never while the caller handles a chunk,
+# so a slow or abandoned consumer cannot keep other workers waiting
+def locked_stream(endpoint, data, cache_key, prompt, max_tokens, received):
+    chunks = queue.Queue()
+    done = object()
+
+    def produce():
+        try:
+            # Another worker streaming the same request fills the shared cache; wait for it instead of repeating it
+            with process_lock(cache_key) as waited:
+                cached = get_response_cache().get(cache_key) if waited else None
+                if cached is not None:
+                    log.debug("Using %s response from another worker", endpoint.name)
+                    received.append(cached)
+                    chunks.put(cached)
+                    return
+                for text in stream_completion(endpoint, data, cache_key, prompt, max_tokens, received):
+                    chunks.put(text)
+        except BaseException as e:
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    # Daemon thread in the caller's context, so the request keeps its scheduler priority
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True).start()
+    while True:
+        item = chunks.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+# Function to stream one completion, collecting the text it yields in received
+def stream_completion(endpoint, data, cache_key, prompt, max_tokens, received):
+    import requests
+
+    response_cache = get_response_cache()
+    circuit_breaker = endpoint.circuit_breaker
+    try:
+        log.info("Sending streaming request to %s (%s)...", endpoint.name, endpoint.model)
+        with endpoint.scheduler.slot(estimate_request_tokens(prompt, max_tokens)) as slot, span("http_stream"):
+            start = time.perf_counter()
+            with post_with_key(slot, endpoint.api_url, data, timeout=get_request_timeout(), stream=True) as response:
+                metrics.inc("flashforge_http_requests_total", status=response.status_code, backend=endpoint.name)
+                if response.status_code != 200:
+                    log.warning("Streaming error: %s", response.status_code)
+                    if response.status_code == 429:
+                        slot.rate_limited(retry_delay(0, response))
+                    elif response.status_code in RETRYABLE_STATUS:
+                        circuit_breaker.record_failure()
+                else:
+                    # Server-sent events: one "data: {...}" line per token batch
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        payload = line[5:].strip()
+                        if payload == "[DONE]":
+                            break
+                        chunk = json.loads(payload)
+                        # The final event carries the token usage of the whole completion
+                        record_usage(chunk.get("usage"), slot, endpoint.name)
+                        text = chunk["choices"][0].get("text", "") if chunk.get("choices") else ""
+                        if text:
+                            if not received:
+                                metrics.observe("flashforge_stage_seconds", time.perf_counter() - start, stage="http_first_token")
+                            received.append(text)
+                            yield text
+                    circuit_breaker.record_success()
+                    result = "".join(received).strip()
+                    if response_cache is not None and result:
+                        response_cache.set(cache_key, result)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        metrics.inc("flashforge_http_requests_total", status="connection_error", backend=endpoint.name)
+        log.warning("Connection error in stream_with_together: %s", e)
+        circuit_breaker.record_failure()
+    except SchedulerBusy:
+        raise
+    except Exception as e:
+        log.error("Error in stream_with_together: %s", e)
@@ -0,0 +1,147 @@
+import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from settings import get_setting
+from caches import get_translation_cache
+from backends import complete
+from chunking import count_tokens
+from generation import get_output_format, get_response_format
+from qa_parser import parse_qa_json, parse_qa_text
+from metrics import get_logger, timed
+from scheduler import submit_in_context
+
+log = get_logger("translation")
+
+# Add language selection and translation functions
+TRANSLATION_MARKER = re.compile(r"^\s*\[(\d+)\]\s*$", re.MULTILINE)
+
+# Function to hash a card for the translation cache
+def card_hash(qa):
+    return hashlib.sha256(json.dumps([qa["question"], qa["answer"]]).encode("utf-8")).hexdigest()
+
+# Function to group card indices into batches that fit the token budget
+def batch_cards_for_translation(qa_pairs, indices, max_tokens):
+    batches = []
+    current = []
+    current_tokens = 0
+    for i in indices:
+        tokens = count_tokens(qa_pairs[i]["question"]) + count_tokens(qa_pairs[i]["answer"]) + 8
+        if current and current_tokens + tokens > max_tokens:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+# Function to translate one batch as JSON, returning {card index: translated pair}
+def translate_batch_json(qa_pairs, indices, target_language):
+    cards_json = json.dumps({"cards": [
+        {"id": n, "question": qa_pairs[i]["question"], "answer": qa_pairs[i]["answer"]}
+        for n, i in enumerate(indices, 1)
+    ]}, ensure_ascii=False)
+    
+    prompt = f"""<s>[INST] <<SYS>>
+You are a helpful AI assistant that translates educational flashcards. Translate the "question" and "answer" of every card in the following JSON to {target_language}.
+Respond with only a JSON object in the same form, keeping every "id" unchanged, and preserve the educational content while making it natural in {target_language}.
+<</SYS>>
+
+Flashcards to translate:
+{cards_json}
+
+Translate all cards to {target_language} as a JSON object: [/INST]</s>"""
+    
+    max_tokens = min(4096, 2 * count_tokens(cards_json) + 256)
+    translated_text = complete(prompt, max_tokens, get_response_format("json"), task="translation")
+    if not translated_text:
+        log.warning("No translation received")
+        return {}
+    
+    # Cards are aligned back by id; a truncated response still yields its complete cards
+    translated = {}
+    for pair in parse_qa_json(translated_text):
+        n = pair.pop("id", None)
+        if n is not None and 1 <= n <= len(indices):
+            translated[indices[n - 1]] = pair
+    return translated
+
+# Function to translate one batch, returning {card index: translated pair}
+def translate_batch(qa_pairs, indices, target_language):
+    if get_output_format() == "json":
+        return translate_batch_json(qa_pairs, indices, target_language)
+    
+    # Number each card so the output can be aligned back by index
+    qa_text = "\n\n".join(
+        f"[{n}]\nQ: {qa_pairs[i]['question']}\nA: {qa_pairs[i]['answer']}"
+        for n, i in enumerate(indices, 1)
+    )
+    
+    prompt = f"""<s>[INST] <<SYS>>
+You are a helpful AI assistant that translates educational flashcards. Translate the following numbered Q&A pairs to {target_language}.
+Keep every [n] marker on its own line exactly as given, maintain the same format with "Q:" and "A:" prefixes, and preserve the educational content while making it natural in {target_language}.
+<</SYS>>
+
+Q&A pairs to translate:
+{qa_text}
+
+Translate all pairs to {target_language}, keeping the [n] markers and the Q: and A: format: [/INST]</s>"""
+    
+    # Translations can take more tokens than the source, especially in non-Latin scripts
+    max_tokens = min(4096, 2 * count_tokens(qa_text) + 256)
+    translated_text = complete(prompt, max_tokens, task="translation")
+    if not translated_text:
+        log.warning("No translation received")
+        return {}
+    
+    # Split on the [n] markers: parts = [preamble, n1, body1, n2, body2, ...]
+    translated = {}
+    parts = TRANSLATION_MARKER.split(translated_text)
+    for n, body in zip(parts[1::2], parts[2::2]):
+        n = int(n)
+        pairs = parse_qa_text(body)
+        if 1 <= n <= len(indices) and pairs:
+            translated[indices[n - 1]] = pairs[0]
+    return translated
+
+# Function to translate Q&A pairs, only sending cards without a cached translation
+# on_progress is called with the number of translated cards after each batch
+@timed("translate")
+def translate_qa_pairs(qa_pairs, target_language, on_progress=None):
+    try:
+        translation_cache = get_translation_cache()
+        translated_pairs = [None] * len(qa_pairs)
+        keys = [f"{card_hash(qa)}:{target_language}" for qa in qa_pairs]
+        missing = []
+        for i, key in enumerate(keys):
+            translated_pairs[i] = translation_cache.get(key)
+            if translated_pairs[i] is None:
+                missing.append(i)
+        
+        if missing:
+            batches = batch_cards_for_translation(qa_pairs, missing, get_setting("TRANSLATION_BATCH_TOKENS", 1500))
+            log.info("Translating %d of %d Q&A pairs to %s in %d batches...", len(missing), len(qa_pairs), target_language, len(batches))
+            max_workers = max(1, min(len(batches), get_setting("TOGETHER_MAX_CONCURRENCY", 4)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [submit_in_context(executor, translate_batch, qa_pairs, batch, target_language) for batch in batches]
+                for future in as_completed(futures):
+                    try:
+                        for i, pair in future.result().items():
+                            translated_pairs[i] = pair
+                            translation_cache.set(keys[i], pair)
+                    except Exception as e:
+                        log.error("Error translating batch: %s", e)
+                    if on_progress:
+                        on_progress(sum(1 for pair in translated_pairs if pair is not None))
+        
+        # Cards that could not be translated are shown in the original language
+        untranslated = sum(1 for pair in translated_pairs if pair is None)
+        log.info("Translated %d pairs", len(qa_pairs) - untranslated)
+        return [pair if pair is not None else qa for pair, qa in zip(translated_pairs, qa_pairs)]
+        
+    except Exception as e:
+        log.error("Error in translation: %s", e)
+        return qa_pairs